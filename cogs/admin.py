@@ -0,0 +1,88 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+import importlib
+import os
+import sys
+from types import ModuleType
+
+import config
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils.roster import reload_rosters
+from utils.storage import reload_storage_config
+
+# modules that copy values out of config.py when they are imported.
+# they hold state (the storage backend and its lock) that has to outlive
+# a reload, so their config values are updated in place instead
+CONFIG_MODULES = ['utils.scheduler', 'utils.storage']
+
+
+def refresh_config(module: ModuleType) -> None:
+    """Point the config names imported by <module> at their new values."""
+    for name in vars(module):
+        if name.isupper() and hasattr(config, name):
+            setattr(module, name, getattr(config, name))
+
+
+class Admin(commands.Cog):
+    """Tournament admin tools."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(
+        name='reload',
+        description='Reload the config, rosters and any changed cogs.'
+    )
+    @app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+    @app_commands.default_permissions(administrator=True)
+    async def reload(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        reloaded: list[str] = []
+
+        # commands that are already running keep the objects they imported
+        config_mtime = os.path.getmtime(config.__file__)
+        config_changed = config_mtime != self.bot.config_mtime
+        if config_changed:
+            importlib.reload(config)
+            for name in CONFIG_MODULES:
+                if name in sys.modules:
+                    refresh_config(sys.modules[name])
+            reload_storage_config()
+            self.bot.config_mtime = config_mtime
+            reloaded.append('config.py')
+
+        reloaded += reload_rosters()
+
+        # every cog imports the config, so reload all of them if it changed
+        for filename in sorted(os.listdir('./cogs')):
+            if not filename.endswith('.py'):
+                continue
+            name = f'cogs.{filename[:-3]}'
+            mtime = os.path.getmtime(f'./cogs/{filename}')
+
+            if name not in self.bot.extensions:
+                await self.bot.load_extension(name)
+            elif config_changed or mtime != self.bot.extension_mtimes[name]:
+                await self.bot.reload_extension(name)
+            else:
+                continue
+
+            self.bot.extension_mtimes[name] = mtime
+            reloaded.append(filename)
+
+        if reloaded:
+            await self.bot.tree.sync(guild=interaction.guild)
+
+        await interaction.followup.send(
+            f'Reloaded: {", ".join(reloaded)}' if reloaded
+            else 'Nothing has changed.',
+            ephemeral=True
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Admin(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
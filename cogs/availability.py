@@ -0,0 +1,124 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from cogs.reschedule import Weekday
+from utils.scheduler import get_player_from_csv, get_referee_from_csv
+from utils.date_handler import get_stage_dates
+from utils.availability import (
+    SLOT_MINUTES,
+    availability_store,
+    weekly_bits,
+    team_key,
+    ref_key
+)
+from config import STAGE_DATES
+
+STAGE_CHOICES = [app_commands.Choice(name=s, value=s) for s in STAGE_DATES]
+
+
+def get_owners(interaction: discord.Interaction) -> list[str]:
+    """
+    Return the availability owner keys of the user of <interaction>:
+    their team if they are a captain, and themselves if they are a ref.
+    """
+    owners = []
+    player = get_player_from_csv(discord_name=interaction.user.name)
+    if player is not None:
+        owners.append(team_key(player.team_name))
+    referee = get_referee_from_csv(discord_name=interaction.user.name)
+    if referee is not None:
+        owners.append(ref_key(referee.osu_name))
+    return owners
+
+
+@app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+class Availability(commands.GroupCog, group_name='availability'):
+    """Register weekly availability for reschedule proposals."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(
+        name='add',
+        description='Mark yourself available on a weekday of a stage (UTC).'
+    )
+    @app_commands.choices(stage=STAGE_CHOICES)
+    async def add(self,
+                  interaction: discord.Interaction,
+                  stage: app_commands.Choice[str],
+                  weekday: Weekday,
+                  start_hour: app_commands.Range[int, 0, 23],
+                  end_hour: app_commands.Range[int, 1, 24]):
+        if end_hour <= start_hour:
+            await interaction.response.send_message(
+                'The end hour has to be after the start hour.',
+                ephemeral=True
+            )
+            return
+
+        owners = get_owners(interaction)
+        if not owners:
+            await interaction.response.send_message(
+                f"You don't appear to be a team captain, solo player or "
+                f"referee registered in this tournament.",
+                ephemeral=True
+            )
+            return
+
+        bits = weekly_bits(
+            stage_days=get_stage_dates(STAGE_DATES)[stage.value],
+            weekday=weekday.value,
+            start_hour=start_hour,
+            end_hour=end_hour
+        )
+        for owner in owners:
+            availability_store.add(owner, stage.value, bits)
+
+        await interaction.response.send_message(
+            f'You are now available on {weekday.name}s from '
+            f'{start_hour}:00 to {end_hour}:00 UTC during **{stage.value}**.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='show',
+        description='Show how much availability you have registered.'
+    )
+    @app_commands.choices(stage=STAGE_CHOICES)
+    async def show(self,
+                   interaction: discord.Interaction,
+                   stage: app_commands.Choice[str]):
+        lines = []
+        for owner in get_owners(interaction):
+            bits = availability_store.get(owner, stage.value) or 0
+            hours = bin(bits).count('1') * SLOT_MINUTES / 60
+            lines.append(f'{owner.split(":", 1)[1]}: {hours:g} hours')
+
+        await interaction.response.send_message(
+            '\n'.join(lines) or 'You have no availability registered.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='clear',
+        description='Clear your availability for a stage.'
+    )
+    @app_commands.choices(stage=STAGE_CHOICES)
+    async def clear(self,
+                    interaction: discord.Interaction,
+                    stage: app_commands.Choice[str]):
+        for owner in get_owners(interaction):
+            availability_store.clear(owner, stage.value)
+
+        await interaction.response.send_message(
+            f'Your availability for **{stage.value}** has been cleared.',
+            ephemeral=True
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Availability(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
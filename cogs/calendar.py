@@ -0,0 +1,135 @@
+import discord
+from discord.ext import commands, tasks
+from aiohttp import web
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils.storage import (
+    get_storage,
+    WARM_RETRY_SECONDS,
+    REFRESH_SECONDS
+)
+from utils.models import QualifierLobby, BracketMatch
+from utils.availability import team_key, ref_key
+from utils.ics import CalendarFeeds
+import config
+
+# how often calendar clients are told to check for changes
+CACHE_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+# optional, see the README. the feeds aren't served without a port
+CALENDAR_NAME = getattr(config, 'CALENDAR_NAME', 'Tournament schedule')
+CALENDAR_HOST = getattr(config, 'CALENDAR_HOST', '127.0.0.1')
+CALENDAR_PORT = getattr(config, 'CALENDAR_PORT', None)
+
+
+def etag_matches(request: web.Request, etag: str) -> bool:
+    """Return whether the If-None-Match header of <request> has <etag>."""
+    header = request.headers.get('If-None-Match')
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+class Calendar(commands.Cog):
+    """
+    Serve the schedule as iCalendar feeds over HTTP:
+
+    /calendar.ics for the whole tournament,
+    /team/<team name>.ics for a team,
+    /ref/<osu! name>.ics for a referee.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.feeds = CalendarFeeds(CALENDAR_NAME)
+        self.runner: Optional[web.AppRunner] = None
+
+    async def cog_load(self):
+        if CALENDAR_PORT is None:
+            logger.info('CALENDAR_PORT is not set, not serving calendars')
+            return
+
+        # the feeds are empty until the tournament can be read
+        self.refresh_loop.start()
+
+        app = web.Application()
+        app.add_routes([
+            web.get('/calendar.ics', self.tournament_feed),
+            web.get('/team/{name}.ics', self.team_feed),
+            web.get('/ref/{name}.ics', self.ref_feed)
+        ])
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, CALENDAR_HOST, CALENDAR_PORT).start()
+
+    async def cog_unload(self):
+        self.refresh_loop.cancel()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    @tasks.loop(seconds=WARM_RETRY_SECONDS)
+    async def refresh_loop(self):
+        # staff edit the sheet directly too, e.g. to assign referees
+        try:
+            qual_lobbies, stages = await get_storage().load_tournament()
+        except Exception:
+            logger.exception('Could not read the tournament, retrying later')
+            return
+
+        self.feeds.replace_all(
+            qual_lobbies=qual_lobbies,
+            matches=[match for matches in stages.values() for match in matches]
+        )
+        self.refresh_loop.change_interval(seconds=REFRESH_SECONDS)
+
+    @commands.Cog.listener()
+    async def on_match_reschedule(self,
+                                  match: BracketMatch,
+                                  new_time: datetime):
+        self.feeds.set_match(match, new_time)
+
+    @commands.Cog.listener()
+    async def on_qual_schedule(self, qual_lobbies: list[QualifierLobby]):
+        # lobbies that didn't change are skipped
+        for lobby in qual_lobbies:
+            self.feeds.set_qual_lobby(lobby)
+
+    def respond(self,
+                request: web.Request,
+                owner: Optional[str]) -> web.Response:
+        """Respond to <request> with the feed of <owner>."""
+        body, etag = self.feeds.feed(owner)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'max-age={CACHE_SECONDS}'
+        }
+        if etag_matches(request, etag):
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=body,
+            content_type='text/calendar',
+            charset='utf-8',
+            headers=headers
+        )
+
+    async def tournament_feed(self, request: web.Request) -> web.Response:
+        return self.respond(request, None)
+
+    async def team_feed(self, request: web.Request) -> web.Response:
+        return self.respond(request, team_key(request.match_info['name']))
+
+    async def ref_feed(self, request: web.Request) -> web.Response:
+        return self.respond(request, ref_key(request.match_info['name']))
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Calendar(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
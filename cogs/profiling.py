@@ -0,0 +1,74 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+from enum import Enum
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils import profiler
+
+
+class ProfiledCommand(Enum):
+    reschedule = 'reschedule'
+    reschedule_accept = 'reschedule accept'
+    reschedule_decline = 'reschedule decline'
+    reschedule_cancel = 'reschedule cancel'
+    qualifier_set = 'qualifier set'
+
+
+@app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+@app_commands.default_permissions(administrator=True)
+class Profiling(commands.GroupCog, group_name='profile'):
+    """Profile commands on demand."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(
+        name='start',
+        description='Profile the next invocations of a command.'
+    )
+    async def start(self,
+                    interaction: discord.Interaction,
+                    command: ProfiledCommand,
+                    count: app_commands.Range[int, 1, 100] = 1):
+        profiler.arm(command.value, count)
+        await interaction.response.send_message(
+            f'Profiling the next {count} invocation(s) of '
+            f'**{command.value}**. Results will be written to '
+            f'`{profiler.PROFILE_DIR}/`.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='stop',
+        description='Stop profiling a command.'
+    )
+    async def stop(self,
+                   interaction: discord.Interaction,
+                   command: ProfiledCommand):
+        profiler.disarm(command.value)
+        await interaction.response.send_message(
+            f'Stopped profiling **{command.value}**.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='status',
+        description='Show which commands are being profiled.'
+    )
+    async def status(self, interaction: discord.Interaction):
+        if not profiler.armed:
+            msg = 'No commands are being profiled.'
+        else:
+            msg = '\n'.join(
+                f'**{name}**: {count} invocation(s) left'
+                for name, count in profiler.armed.items()
+            )
+        await interaction.response.send_message(msg, ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Profiling(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
@@ -3,25 +3,18 @@ from discord.ext import commands
 from discord import app_commands
 
 from env import BOT_TEST_SERVER, RGR_SERVER
-from utils.sheets import get_worksheet
+from utils.profiler import profiled, to_thread
+from utils.storage import get_storage
 from utils.scheduler import (
-    get_qual_col_order,
     get_player_from_csv,
-    get_qual_lobbies,
-    schedule_qual
+    get_availability_from_csv,
+    place_qual_players
 )
 from utils.scheduler import (
     LobbyNotFound,
     FullLobbyError,
     SameLobbyError
 )
-from config import (
-    SPREADSHEET_KEY,
-    QUAL_WORKSHEET_NAME,
-    QUAL_RANGE,
-    QUAL_SLOTS_COL_START,
-    QUAL_SLOTS_COL_END
-)
 
 
 @app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
@@ -33,12 +26,16 @@ class Qualifier(commands.GroupCog, group_name='qualifier'):
         name='set',
         description='Schedule or reschedule a qualifier lobby.'
     )
+    @profiled('qualifier set')
     async def set_(self,
                    interaction: discord.Interaction,
                    match_id: str):
         await interaction.response.defer()
 
-        player = get_player_from_csv(discord_name=interaction.user.name)
+        # the roster is checked first, so strangers don't cost a sheet read
+        player = await to_thread(
+            get_player_from_csv, discord_name=interaction.user.name
+        )
         if player is None:
             await interaction.followup.send(
                 f"You don't appear to be a team captain (or solo player) "
@@ -47,26 +44,26 @@ class Qualifier(commands.GroupCog, group_name='qualifier'):
             )
             return
 
-        wks = get_worksheet(
-            spreadsheet_key=SPREADSHEET_KEY,
-            worksheet_name=QUAL_WORKSHEET_NAME
-        )
-        qual_lobbies = get_qual_lobbies(
-            worksheet=wks,
-            qual_range=QUAL_RANGE,
-            col_idxs=get_qual_col_order()
-        )
+        storage = get_storage()
+        version = storage.qual_version
+        qual_lobbies = await to_thread(storage.get_qual_lobbies)
         match_id = match_id.upper()
 
         try:
-            schedule_qual(
-                worksheet=wks,
-                qual_lobbies=qual_lobbies,
-                match_id=match_id,
-                player=player,
-                slots_start=QUAL_SLOTS_COL_START,
-                slots_end=QUAL_SLOTS_COL_END
-            )
+            async with storage.qual_lock:
+                # someone else signed up since the read, so read again
+                if version != storage.qual_version:
+                    qual_lobbies = await to_thread(
+                        storage.get_qual_lobbies
+                    )
+                await to_thread(
+                    storage.schedule_qual,
+                    qual_lobbies=qual_lobbies,
+                    match_id=match_id,
+                    player=player
+                )
+                storage.qual_version += 1
+            interaction.client.dispatch('qual_schedule', qual_lobbies)
         except LobbyNotFound:
             await interaction.followup.send(
                 f'Lobby **{match_id}** was not found!'
@@ -89,7 +86,82 @@ class Qualifier(commands.GroupCog, group_name='qualifier'):
         )
 
 
+class QualifierAdmin(commands.Cog):
+    """
+    Qualifier tools for admins. Discord ignores default permissions on
+    subcommands, so these can't be part of the /qualifier group.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(
+        name='place-qualifiers',
+        description='Place every team with submitted availability '
+                    'into a qualifier lobby.'
+    )
+    @app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+    @app_commands.default_permissions(administrator=True)
+    async def place(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+
+        try:
+            windows_by_team = await to_thread(get_availability_from_csv)
+        except FileNotFoundError:
+            await interaction.followup.send(
+                'There is no availability.csv in the bot\'s directory. '
+                'Add one with a row per team availability window '
+                '(Team Name, Start, End), then try again.'
+            )
+            return
+
+        # near-miss names resolve like they do on the sheet
+        availability = {}
+        players = []
+        unknown = []
+        for team_name, windows in windows_by_team.items():
+            player = get_player_from_csv(team_name=team_name)
+            if player is None:
+                unknown.append(team_name)
+                continue
+            if player.team_name not in availability:
+                players.append(player)
+            availability.setdefault(player.team_name, []).extend(windows)
+
+        storage = get_storage()
+        async with storage.qual_lock:
+            qual_lobbies = await to_thread(storage.get_qual_lobbies)
+            unplaced = await to_thread(
+                place_qual_players,
+                qual_lobbies=qual_lobbies,
+                players=players,
+                availability=availability
+            )
+            await to_thread(storage.write_qual_lobbies, qual_lobbies)
+            storage.qual_version += 1
+        interaction.client.dispatch('qual_schedule', qual_lobbies)
+
+        msg = (
+            f'Placed **{len(players) - len(unplaced)}** of '
+            f'**{len(players)}** teams into qualifier lobbies.'
+        )
+        if unplaced:
+            msg += (
+                f'\nCould not place: '
+                f'{", ".join(p.team_name for p in unplaced)}'
+            )
+        if unknown:
+            msg += (
+                f'\nNot in the roster: '
+                f'{", ".join(unknown)}'
+            )
+        await interaction.followup.send(msg[:2000])
+
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(Qualifier(bot),
                       guilds=[discord.Object(id=BOT_TEST_SERVER),
                               discord.Object(id=RGR_SERVER)])
+    await bot.add_cog(QualifierAdmin(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
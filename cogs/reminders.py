@@ -0,0 +1,156 @@
+import discord
+from discord.ext import commands, tasks
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils.storage import get_storage, WARM_RETRY_SECONDS
+from utils.models import BracketMatch
+from utils.reminders import Reminder, ReminderQueue, reminder_from_match
+import config
+
+logger = logging.getLogger(__name__)
+
+# optional, see the README. no reminders are sent without a channel
+REMINDER_CHANNEL_ID = getattr(config, 'REMINDER_CHANNEL_ID', None)
+REMINDER_OFFSET_MINUTES = getattr(config, 'REMINDER_OFFSET_MINUTES', 30)
+
+
+class Reminders(commands.Cog):
+    """
+    Remind players and referees shortly before their matches start.
+
+    A single task sleeps until the earliest pending reminder is due,
+    so idle reminders cost nothing but their heap entry.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.offset = timedelta(minutes=REMINDER_OFFSET_MINUTES)
+        self.queue = ReminderQueue('reminders.json')
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def cog_load(self):
+        if REMINDER_CHANNEL_ID is None:
+            logger.info('REMINDER_CHANNEL_ID is not set, not sending reminders')
+            return
+
+        # reminders saved before a restart, then the current bracket snapshot.
+        # the saved ones are sent even if the bracket can't be read yet
+        self.queue.load()
+        self._task = asyncio.create_task(self.run())
+        self.warm_loop.start()
+
+    async def cog_unload(self):
+        if self._task is None:
+            return
+        self.warm_loop.cancel()
+        self._task.cancel()
+        self.queue.save()
+
+    @tasks.loop(seconds=WARM_RETRY_SECONDS)
+    async def warm_loop(self):
+        try:
+            _, stages = await get_storage().load_tournament()
+        except Exception:
+            logger.exception('Could not read the bracket, retrying later')
+            return
+
+        now = datetime.now(timezone.utc)
+        for match in [m for matches in stages.values() for m in matches]:
+            reminder = reminder_from_match(match, self.offset)
+            if reminder.remind_at > now:
+                self.queue.push(reminder)
+        self.queue.save()
+        self._wakeup.set()
+        self.warm_loop.stop()
+
+    @commands.Cog.listener()
+    async def on_match_reschedule(self,
+                                  match: BracketMatch,
+                                  new_time: datetime):
+        if self._task is None:
+            return
+
+        reminder = reminder_from_match(match, self.offset)
+        reminder.remind_at = new_time - self.offset
+        if reminder.remind_at > datetime.now(timezone.utc):
+            self.queue.push(reminder)
+        else:
+            self.queue.remove(match.id)
+        self.queue.save()
+
+        # the new time might be earlier than the one being slept on
+        self._wakeup.set()
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+
+        while True:
+            self._wakeup.clear()
+            next_time = self.queue.next_time()
+
+            if next_time is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = (next_time - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            due = self.queue.pop_due(datetime.now(timezone.utc))
+            self.queue.save()
+            for reminder in due:
+                # one failed send shouldn't stop the remaining reminders
+                try:
+                    await self.send(reminder)
+                except Exception:
+                    logger.exception(
+                        'Could not send the reminder for match %s',
+                        reminder.match_id
+                    )
+
+    async def send(self, reminder: Reminder):
+        channel = self.bot.get_channel(REMINDER_CHANNEL_ID)
+        if channel is None or getattr(channel, 'guild', None) is None:
+            logger.warning(
+                'Reminder channel %s is not a server channel the bot can see',
+                REMINDER_CHANNEL_ID
+            )
+            return
+
+        # mentioning someone by ID doesn't need their member object
+        mentions = []
+        for name, id_ in reminder.mentions:
+            if id_ is None:
+                member = channel.guild.get_member_named(name)
+                id_ = member.id if member else None
+            if id_ is not None:
+                mentions.append(f'<@{id_}>')
+            else:
+                # at least say who it's for
+                logger.warning(
+                    'No Discord ID for %s in the reminder for match %s',
+                    name, reminder.match_id
+                )
+                mentions.append(f'@{name}')
+
+        await channel.send(
+            f'{" ".join(mentions)} '
+            f'Match **{reminder.match_id}** starts '
+            f'<t:{int((reminder.remind_at + self.offset).timestamp())}:R>!'
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Reminders(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
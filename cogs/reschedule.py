@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 import discord
 from discord.ext import commands
 from discord import app_commands
@@ -7,27 +10,27 @@ from typing import Optional
 from enum import Enum
 
 from env import BOT_TEST_SERVER, RGR_SERVER
-from utils.sheets import get_worksheet
-from utils.sheets import Worksheet
-from utils.scheduler import (
-    get_match_col_order,
-    get_player_from_csv,
-    get_bracket_matches,
-    validate_reschedule,
-    reschedule_match
-)
+from utils.storage import get_storage, StorageBackend
+from utils.scheduler import get_player_from_csv, validate_reschedule
 from utils.scheduler import LobbyNotFound, NotMatchParticipant
 from utils.scheduler import BracketMatch
-from utils.date_handler import get_stage_dates, weekday_to_dt
-from utils.date_handler import StageNotFound
-from config import (
-    SPREADSHEET_KEY,
-    BSTAGE_WORKSHEET_NAME,
-    BSTAGE_RANGE,
-    BSTAGE_DATE_SHEET_COL,
-    BSTAGE_TIME_SHEET_COL,
-    STAGE_DATES
+from utils.date_handler import get_stage_dates, get_stage, weekday_to_dt
+from utils.availability import (
+    availability_store,
+    common_availability,
+    best_slots,
+    full_bits,
+    team_key,
+    ref_key
 )
+from utils.profiler import profiled, to_thread
+from utils.members import member_lookup
+from config import STAGE_DATES
+
+# the most proposed times that fit in a reschedule request
+MAX_TIME_OPTIONS = 5
+
+logger = logging.getLogger(__name__)
 
 
 class Weekday(Enum):
@@ -45,6 +48,7 @@ class RescheduleStatus(Enum):
     ACCEPTED = '🟢 Accepted'
     DECLINED = '🔴 Declined'
     CANCELLED = '⚪ Cancelled'
+    FAILED = '⚠️ Could not be saved'
 
 
 class ReschedStatusColour(Enum):
@@ -52,6 +56,7 @@ class ReschedStatusColour(Enum):
     ACCEPTED = discord.Colour.from_rgb(120, 177, 89)
     DECLINED = discord.Colour.from_rgb(221, 46, 68)
     CANCELLED = discord.Colour.from_rgb(230, 231, 232)
+    FAILED = discord.Colour.from_rgb(244, 144, 12)
 
 
 def change_status(reschedule_embed: discord.Embed,
@@ -70,32 +75,33 @@ def change_status(reschedule_embed: discord.Embed,
     reschedule_embed.colour = new_colour.value
 
 
+def format_time(dt: datetime) -> str:
+    """Format <dt> for a reschedule embed."""
+    # TODO: use - for linux, # for windows
+    TIME_FORMAT = '%a, %b %#d at %#H:%M UTC'
+
+    return f'{dt.strftime(TIME_FORMAT)}\n(<t:{int(dt.timestamp())}:F>)'
+
+
 def create_resched_embed(status: RescheduleStatus,
                          colour: ReschedStatusColour,
                          match: BracketMatch,
-                         new_time: datetime,
+                         new_times: list[datetime],
                          sender_team_name: str,
                          thumbnail_url: str) -> discord.Embed:
-    """Create a reschedule embed."""
-    # TODO: use - for linux, # for windows
-    TIME_FORMAT = '%a, %b %#d at %#H:%M UTC'
-
+    """
+    Create a reschedule embed proposing one or more <new_times>.
+    """
     em = discord.Embed(title=f'Match ID: {match.id}', colour=colour.value)
     em.set_author(name=f'{sender_team_name} wants to reschedule')
     em.add_field(
         name='Old Time',
-        value=(
-            f'{match.time.strftime(TIME_FORMAT)}\n'
-            f'(<t:{int(match.time.timestamp())}:F>)'
-        ),
+        value=format_time(match.time),
         inline=False
     )
     em.add_field(
-        name='New Time',
-        value=(
-            f'{new_time.strftime(TIME_FORMAT)}\n'
-            f'(<t:{int(new_time.timestamp())}:F>)'
-        ),
+        name='New Time' if len(new_times) == 1 else 'New Time Options',
+        value='\n'.join(format_time(t) for t in new_times),
         inline=False
     )
     em.add_field(name='Status', value=status.value, inline=False)
@@ -106,112 +112,197 @@ def create_resched_embed(status: RescheduleStatus,
 
 class RescheduleButtons(discord.ui.View):
     def __init__(self,
-                 worksheet: Worksheet,
+                 storage: StorageBackend,
                  match: BracketMatch,
                  new_time: datetime,
                  sender: discord.User,
                  receiver: discord.Member):
         super().__init__(timeout=259200)  # 3 days
-        self.worksheet = worksheet  # TODO: make sure this doesn't mess w api
+        self.storage = storage
         self.match = match
         self.new_time = new_time
         self.sender = sender
         self.receiver = receiver
 
-        self.message: discord.Message
+        self.message: discord.PartialMessage
 
     async def on_timeout(self):
         self.clear_items()
         await self.message.edit(view=self)
 
-    @discord.ui.button(label='Accept', style=discord.ButtonStyle.green)
-    async def accept(self,
-                     interaction: discord.Interaction,
-                     button: discord.ui.Button):
-        if interaction.user != self.receiver:
+    async def close(self,
+                    interaction: discord.Interaction,
+                    new_status: RescheduleStatus,
+                    new_colour: ReschedStatusColour) -> None:
+        """
+        Change the status of the reschedule embed and remove the buttons
+        in a single response to <interaction>, or by editing the response
+        if it was already deferred.
+        """
+        embed = interaction.message.embeds[0]
+        change_status(
+            reschedule_embed=embed,
+            new_status=new_status,
+            new_colour=new_colour
+        )
+        if new_status == RescheduleStatus.ACCEPTED:
+            embed.set_field_at(
+                index=1,
+                name='New Time',
+                value=format_time(self.new_time),
+                inline=False
+            )
+
+        self.stop()
+        if interaction.response.is_done():
+            await interaction.edit_original_response(embed=embed, view=None)
+        else:
+            await interaction.response.edit_message(embed=embed, view=None)
+
+    async def get_referee(self,
+                          guild: discord.Guild) -> Optional[discord.Member]:
+        """Return the member refereeing the match, if there is one."""
+        if self.match.referee is None:
+            return
+        return await member_lookup.get(
+            guild=guild,
+            discord_id=self.match.referee.discord_id,
+            discord_name=self.match.referee.discord_name
+        )
+
+    async def apply(self, interaction: discord.Interaction) -> None:
+        """Reschedule the match to <self.new_time>."""
+        # the write can take longer than the 3 seconds Discord gives us to
+        # respond, so acknowledge the click first. Stopping the view now
+        # keeps a second click from writing the match again
+        self.stop()
+        await interaction.response.defer()
+
+        # look up the ref to ping while the new time is written
+        try:
+            _, ref = await asyncio.gather(
+                to_thread(
+                    self.storage.reschedule_match,
+                    match=self.match,
+                    new_time=self.new_time
+                ),
+                self.get_referee(interaction.guild)
+            )
+        except Exception:
+            logger.exception('Could not reschedule match %s', self.match.id)
+            # the buttons are gone, so the request has to be sent again
+            await self.close(
+                interaction=interaction,
+                new_status=RescheduleStatus.FAILED,
+                new_colour=ReschedStatusColour.FAILED
+            )
+            await interaction.followup.send(
+                "The new time couldn't be saved. Please send a new "
+                "reschedule request, or contact staff if it keeps failing.",
+                ephemeral=True
+            )
             return
+        interaction.client.dispatch(
+            'match_reschedule', self.match, self.new_time
+        )
 
-        reschedule_match(
-            worksheet=self.worksheet,
-            match=self.match,
-            new_time=self.new_time,
-            date_col=BSTAGE_DATE_SHEET_COL,
-            time_col=BSTAGE_TIME_SHEET_COL
+        await self.close(
+            interaction=interaction,
+            new_status=RescheduleStatus.ACCEPTED,
+            new_colour=ReschedStatusColour.ACCEPTED
         )
 
         # ping sender and ref to let them know it's been rescheduled
-        if self.match.referee:
-            ref = interaction.guild.get_member_named(
-                self.match.referee.discord_name
-            )
-        else:
-            ref = None
 
         # TODO: handle case where the ref's disc name is wrong in the csv
         # clean this up later
         if ref:
-            await self.message.reply(
+            await interaction.message.reply(
                 f'<@{self.sender.id}> <@{ref.id}> '
                 f'This match has been rescheduled.'
             )
         else:
-            await self.message.reply(
+            await interaction.message.reply(
                 f'<@{self.sender.id}> '
                 f'This match has been rescheduled.'
             )
 
-        embed = self.message.embeds[0]
-        change_status(
-            reschedule_embed=embed,
-            new_status=RescheduleStatus.ACCEPTED,
-            new_colour=ReschedStatusColour.ACCEPTED
-        )
+    @discord.ui.button(label='Accept', style=discord.ButtonStyle.green)
+    @profiled('reschedule accept')
+    async def accept(self,
+                     interaction: discord.Interaction,
+                     button: discord.ui.Button):
+        if interaction.user != self.receiver:
+            return
 
-        await self.message.edit(
-            embed=embed,
-            view=self
-        )
-        await self.on_timeout()
+        await self.apply(interaction)
 
     @discord.ui.button(label='Decline', style=discord.ButtonStyle.red)
+    @profiled('reschedule decline')
     async def decline(self,
                       interaction: discord.Interaction,
                       button: discord.ui.Button):
         if interaction.user != self.receiver:
             return
 
-        embed = self.message.embeds[0]
-        change_status(
-            reschedule_embed=embed,
+        await self.close(
+            interaction=interaction,
             new_status=RescheduleStatus.DECLINED,
             new_colour=ReschedStatusColour.DECLINED
         )
 
-        await self.message.edit(
-            embed=embed,
-            view=self
-        )
-        await self.on_timeout()
-
     @discord.ui.button(label='Cancel', style=discord.ButtonStyle.gray)
+    @profiled('reschedule cancel')
     async def cancel(self,
                      interaction: discord.Interaction,
                      button: discord.ui.Button):
         if interaction.user != self.sender:
             return
 
-        embed = self.message.embeds[0]
-        change_status(
-            reschedule_embed=embed,
+        await self.close(
+            interaction=interaction,
             new_status=RescheduleStatus.CANCELLED,
             new_colour=ReschedStatusColour.CANCELLED
         )
 
-        await self.message.edit(
-            embed=embed,
-            view=self
+
+class TimeOptionButton(discord.ui.Button):
+    """A button that accepts a reschedule to one proposed time."""
+    def __init__(self, time: datetime):
+        super().__init__(
+            label=time.strftime('%a %H:%M UTC'),
+            style=discord.ButtonStyle.green
         )
-        await self.on_timeout()
+        self.time = time
+
+    async def callback(self, interaction: discord.Interaction):
+        view: RescheduleOptions = self.view
+        if interaction.user != view.receiver:
+            return
+
+        view.new_time = self.time
+        await view.apply(interaction)
+
+
+class RescheduleOptions(RescheduleButtons):
+    """
+    Same as RescheduleButtons, but the receiver accepts by
+    picking one of several proposed times.
+    """
+    def __init__(self,
+                 storage: StorageBackend,
+                 match: BracketMatch,
+                 new_times: list[datetime],
+                 sender: discord.User,
+                 receiver: discord.Member):
+        super().__init__(storage, match, None, sender, receiver)
+
+        # put the times first, then decline and cancel
+        self.clear_items()
+        for time in new_times:
+            self.add_item(TimeOptionButton(time))
+        self.add_item(self.decline)
+        self.add_item(self.cancel)
 
 
 class Reschedule(commands.Cog):
@@ -223,15 +314,31 @@ class Reschedule(commands.Cog):
         description='Send a request to an opponent to reschedule a match.'
     )
     @app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
-    async def reschedule(self,
-                         interaction: discord.Interaction,
-                         match_id: str,
-                         weekday: Weekday,
-                         hour: app_commands.Range[int, 0, 23],
-                         minute: Optional[app_commands.Range[int, 0, 59]] = 0):
+    @app_commands.describe(
+        weekday='Leave out the weekday and hour to offer times '
+                'when both teams are available.'
+    )
+    @profiled('reschedule')
+    async def reschedule(
+            self,
+            interaction: discord.Interaction,
+            match_id: str,
+            weekday: Optional[Weekday] = None,
+            hour: Optional[app_commands.Range[int, 0, 23]] = None,
+            minute: Optional[app_commands.Range[int, 0, 59]] = 0):
         await interaction.response.defer()
 
-        player = get_player_from_csv(discord_name=interaction.user.name)
+        if (weekday is None) != (hour is None):
+            await interaction.followup.send(
+                'Please give both a weekday and an hour, or neither '
+                'to pick from times when both teams are available.'
+            )
+            return
+
+        # the cheap checks come first, so they don't cost a sheet read
+        player = await to_thread(
+            get_player_from_csv, discord_name=interaction.user.name
+        )
         if player is None:
             await interaction.followup.send(
                 f"You don't appear to be a team captain (or solo player) "
@@ -241,29 +348,26 @@ class Reschedule(commands.Cog):
             return
 
         stage_dates = get_stage_dates(STAGE_DATES)
-        try:
+        reference_date = datetime(2023, 8, 19)  # TODO: change to datetime.now() for prod
+        stage = get_stage(stage_dates, reference_date)
+        if stage is None:
+            await interaction.followup.send(
+                'Reschedules are currently unavailable.'
+            )
+            return
+
+        new_time = None
+        if weekday is not None:
             new_time = weekday_to_dt(
                 stage_dates=stage_dates,
-                reference_date=datetime(2023, 8, 19),  # TODO: change to datetime.now() for prod
+                reference_date=reference_date,
                 weekday=weekday.value,
                 hour=hour,
                 minute=minute
             )
-        except StageNotFound:
-            await interaction.followup.send(
-                'Reschedules are currently unavailable.'
-            )
-            return
 
-        wks = get_worksheet(
-            spreadsheet_key=SPREADSHEET_KEY,
-            worksheet_name=BSTAGE_WORKSHEET_NAME
-        )
-        matches = get_bracket_matches(
-            worksheet=wks,
-            match_range=BSTAGE_RANGE,
-            col_idxs=get_match_col_order()
-        )
+        storage = get_storage()
+        matches = await to_thread(storage.get_bracket_matches)
 
         try:
             # TODO: this raises AttributeError if the csv is missing a player
@@ -285,21 +389,75 @@ class Reschedule(commands.Cog):
             )
             return
 
-        # get the opponent's discord username
-        opp_discord_name = (
-            match.player1.discord_name if match.player1 != player
-            else match.player2.discord_name
-        )
         # get the discord.Member object of the opponent
-        opponent = interaction.guild.get_member_named(opp_discord_name)
-
-        view = RescheduleButtons(
-            worksheet=wks,
-            match=match,
-            new_time=new_time,
-            sender=interaction.user,
-            receiver=opponent
+        opp = match.player1 if match.player1 != player else match.player2
+        if opp is None:
+            await interaction.followup.send(
+                f'Match **{match.id}** has no opponent yet.'
+            )
+            return
+        opponent = await member_lookup.get(
+            guild=interaction.guild,
+            discord_id=opp.discord_id,
+            discord_name=opp.discord_name
         )
+        if opponent is None:
+            # without the members intent, only roster IDs can be looked up
+            await interaction.followup.send(
+                f"Couldn't find **{opp.discord_name}**, the captain of "
+                f"**{opp.team_name}**, in this server. Please ask a "
+                f"tournament admin to check their Discord ID in the roster."
+            )
+            return
+
+        if new_time is not None:
+            new_times = [new_time]
+            view = RescheduleButtons(
+                storage=storage,
+                match=match,
+                new_time=new_time,
+                sender=interaction.user,
+                receiver=opponent
+            )
+        else:
+            # intersect the weekly availability of both teams and the ref
+            bits = common_availability(
+                store=availability_store,
+                stage=stage,
+                required=[team_key(p.team_name) for p in (player, opp)],
+                optional=[ref_key(match.referee.osu_name)]
+                if match.referee else []
+            )
+            if bits is None:
+                await interaction.followup.send(
+                    'Both teams need to register their availability with '
+                    '`/availability add` before times can be offered. '
+                    'You can still propose a weekday and hour yourself.'
+                )
+                return
+
+            new_times = best_slots(
+                bits=bits & full_bits(stage_dates[stage]),
+                stage_days=stage_dates[stage],
+                near=match.time,
+                after=reference_date,
+                count=MAX_TIME_OPTIONS
+            )
+            if not new_times:
+                await interaction.followup.send(
+                    "There are no times this stage when both teams "
+                    "(and the ref) are available. Please propose a weekday "
+                    "and hour instead."
+                )
+                return
+
+            view = RescheduleOptions(
+                storage=storage,
+                match=match,
+                new_times=new_times,
+                sender=interaction.user,
+                receiver=opponent
+            )
 
         webhook_msg: discord.WebhookMessage = await interaction.followup.send(
             content=f'<@{opponent.id}>',
@@ -307,14 +465,15 @@ class Reschedule(commands.Cog):
                 status=RescheduleStatus.PENDING,
                 colour=ReschedStatusColour.PENDING,
                 match=match,
-                new_time=new_time,
+                new_times=new_times,
                 sender_team_name=player.team_name,
                 thumbnail_url=interaction.guild.icon.url
             ),
             view=view
         )
 
-        view.message = await webhook_msg.fetch()
+        # edited with the bot's token once the interaction token has expired
+        view.message = interaction.channel.get_partial_message(webhook_msg.id)
 
 
 async def setup(bot: commands.Bot):
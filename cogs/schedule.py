@@ -0,0 +1,118 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils.scheduler import get_player_from_csv
+from utils.storage import (
+    get_storage,
+    WARM_RETRY_SECONDS,
+    REFRESH_SECONDS
+)
+from utils.models import BracketMatch
+from utils.schedule_mirror import ScheduleMirror
+
+logger = logging.getLogger(__name__)
+
+
+def format_matches(matches: list[BracketMatch]) -> str:
+    """Return one line per match in <matches>."""
+    lines = []
+    for match in matches:
+        p1 = match.player1.team_name if match.player1 else 'TBD'
+        p2 = match.player2.team_name if match.player2 else 'TBD'
+        ref = match.referee.osu_name if match.referee else 'no ref'
+        lines.append(
+            f'**{match.id}**: {p1} vs {p2} '
+            f'(<t:{int(match.time.timestamp())}:F>, {ref})'
+        )
+    return '\n'.join(lines)
+
+
+@app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+class Schedule(commands.GroupCog, group_name='schedule'):
+    """Answer schedule questions from a local mirror of the bracket."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.mirror = ScheduleMirror('schedule.db')
+
+    async def cog_load(self):
+        self.refresh_loop.start()
+
+    async def cog_unload(self):
+        self.refresh_loop.cancel()
+        self.mirror.conn.close()
+
+    @tasks.loop(seconds=WARM_RETRY_SECONDS)
+    async def refresh_loop(self):
+        # staff edit the sheet directly too, e.g. to assign referees
+        try:
+            _, stages = await get_storage().load_tournament()
+        except Exception:
+            logger.exception('Could not read the bracket, retrying later')
+            return
+
+        self.mirror.replace_all(
+            [match for matches in stages.values() for match in matches]
+        )
+        self.refresh_loop.change_interval(seconds=REFRESH_SECONDS)
+
+    @commands.Cog.listener()
+    async def on_match_reschedule(self,
+                                  match: BracketMatch,
+                                  new_time: datetime):
+        self.mirror.update_time(match.id, new_time)
+
+    @app_commands.command(
+        name='mine',
+        description='Show the schedule of your matches.'
+    )
+    async def mine(self, interaction: discord.Interaction):
+        player = get_player_from_csv(discord_name=interaction.user.name)
+        if player is None:
+            await interaction.response.send_message(
+                f"You don't appear to be a team captain (or solo player) "
+                f"registered in this tournament.",
+                ephemeral=True
+            )
+            return
+
+        matches = self.mirror.matches_for_team(player.team_name)
+        await interaction.response.send_message(
+            format_matches(matches) or 'You have no scheduled matches.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='today',
+        description="Show today's matches (UTC)."
+    )
+    async def today(self, interaction: discord.Interaction):
+        start = datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        matches = self.mirror.matches_between(start, start + timedelta(days=1))
+        await interaction.response.send_message(
+            format_matches(matches) or 'There are no matches today.'
+        )
+
+    @app_commands.command(
+        name='ref',
+        description='Show the matches you are refereeing.'
+    )
+    async def ref(self, interaction: discord.Interaction):
+        matches = self.mirror.matches_for_ref(interaction.user.name)
+        await interaction.response.send_message(
+            format_matches(matches) or 'You are not reffing any matches.',
+            ephemeral=True
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Schedule(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+
+from env import BOT_TEST_SERVER, RGR_SERVER
+from utils.storage import get_storage, LocalBackend
+import config
+
+logger = logging.getLogger(__name__)
+
+# optional, see the README
+STORAGE_EXPORT_MINUTES = getattr(config, 'STORAGE_EXPORT_MINUTES', 5)
+
+
+@app_commands.guilds(BOT_TEST_SERVER, RGR_SERVER)
+@app_commands.default_permissions(administrator=True)
+class Storage(commands.GroupCog, group_name='storage'):
+    """Export the local storage backend to the spreadsheet."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        if isinstance(get_storage(), LocalBackend):
+            self.export_loop.start()
+
+    async def cog_unload(self):
+        self.export_loop.cancel()
+        if isinstance(get_storage(), LocalBackend):
+            await self.export_changes()
+
+    async def export_changes(self) -> None:
+        """
+        Export the local changes in a worker thread. Failures are logged,
+        and the rows stay dirty to be exported next time.
+        """
+        try:
+            await asyncio.to_thread(get_storage().export)
+        except Exception:
+            logger.exception('Could not export to the spreadsheet')
+
+    @tasks.loop(minutes=STORAGE_EXPORT_MINUTES)
+    async def export_loop(self):
+        await self.export_changes()
+
+    @app_commands.command(
+        name='export',
+        description='Write all local changes to the spreadsheet now.'
+    )
+    async def export(self, interaction: discord.Interaction):
+        storage = get_storage()
+        if not isinstance(storage, LocalBackend):
+            await interaction.response.send_message(
+                'The spreadsheet is already the storage backend.',
+                ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        count = await asyncio.to_thread(storage.export)
+        await interaction.followup.send(
+            f'Exported {count} changed row(s) to the spreadsheet.',
+            ephemeral=True
+        )
+
+    @app_commands.command(
+        name='import',
+        description='Export local changes, then re-read the spreadsheet.'
+    )
+    async def import_(self, interaction: discord.Interaction):
+        storage = get_storage()
+        if not isinstance(storage, LocalBackend):
+            await interaction.response.send_message(
+                'The spreadsheet is already the storage backend.',
+                ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        await asyncio.to_thread(storage.export)
+        await asyncio.to_thread(storage.import_from_sheets)
+        await interaction.followup.send(
+            'Re-read the spreadsheet into local storage.',
+            ephemeral=True
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Storage(bot),
+                      guilds=[discord.Object(id=BOT_TEST_SERVER),
+                              discord.Object(id=RGR_SERVER)])
@@ -0,0 +1,402 @@
+"""
+Load test the cogs with fake Discord interactions and an in-memory
+worksheet that simulates Google Sheets latency.
+
+Usage: python loadtest.py [--latency 0.3] [--max-concurrency 64]
+                          [--lobbies 4] [--scenario qualifier|reschedule]
+
+Run it from the bot's directory so config.py and env.py can be imported.
+A temporary roster is generated, so players.csv and refs.csv are untouched.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils.storage  # noqa: E402
+from cogs.qualifier import Qualifier  # noqa: E402
+from cogs.reschedule import Reschedule, Weekday  # noqa: E402
+from utils.sheets import SheetRange, col_to_number  # noqa: E402
+from utils.roster import reload_rosters  # noqa: E402
+from utils.scheduler import get_qual_projection, get_match_projection  # noqa: E402,E501
+from config import QUAL_RANGE, BSTAGE_RANGE  # noqa: E402
+
+
+class FakeWorksheet:
+    """An in-memory stand-in for a gspread Worksheet."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.values: dict[tuple[int, int], object] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def _cells(self, range_: str) -> list[tuple[int, int]]:
+        if ':' not in range_:
+            range_ = f'{range_}:{range_}'
+        r = SheetRange(range_)
+        return [
+            (row, col)
+            for row in range(int(r.start_row), int(r.end_row) + 1)
+            for col in range(col_to_number(r.start_col),
+                             col_to_number(r.end_col) + 1)
+        ]
+
+    def batch_get(self, ranges: list[str], **kwargs) -> list[list[list]]:
+        time.sleep(self.latency)
+        self.reads += 1
+
+        res = []
+        for range_ in ranges:
+            rows: dict[int, list] = {}
+            for row, col in self._cells(range_):
+                rows.setdefault(row, []).append(self.values.get((row, col), ''))
+            res.append(list(rows.values()))
+        return res
+
+    def update(self, range_: str, values, **kwargs) -> None:
+        time.sleep(self.latency)
+        self.writes += 1
+
+        if not isinstance(values, list):
+            values = [[values]]
+        flat = [v for row in values for v in row]
+        for (row, col), value in zip(self._cells(range_), flat):
+            self.values[(row, col)] = value
+
+    def batch_update(self, data: list[dict], **kwargs) -> None:
+        for item in data:
+            self.update(item['range'], item['values'])
+        self.writes -= len(data) - 1
+
+
+class FakeMember:
+    def __init__(self, id_: int, name: str):
+        self.id = id_
+        self.name = name
+
+
+class FakeMessage:
+    def __init__(self, embed=None, view=None):
+        self.embeds = [embed] if embed else []
+        self.view = view
+        self.id = id(self)
+
+    async def fetch(self):
+        return self
+
+    async def edit(self, **kwargs):
+        if 'embed' in kwargs:
+            self.embeds = [kwargs['embed']]
+
+    async def reply(self, content: str):
+        pass
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages: dict[int, FakeMessage] = {}
+
+    def get_partial_message(self, id_: int) -> FakeMessage:
+        return self.messages[id_]
+
+
+class FakeIcon:
+    url = 'https://example.com/icon.png'
+
+
+class FakeGuild:
+    def __init__(self, members: dict[str, FakeMember]):
+        self.members = members
+        self.icon = FakeIcon()
+        self.channel = FakeChannel()
+
+    def get_member_named(self, name: str) -> Optional[FakeMember]:
+        return self.members.get(name)
+
+
+class FakeClient:
+    def dispatch(self, event: str, *args):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+        self.interaction.mark_response()
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+        self.interaction.mark_response()
+        self.interaction.mark_followup()
+        await self.interaction.message.edit(**kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content: str = '', embed=None, view=None, **kwargs):
+        self.interaction.mark_response()
+        self.interaction.mark_followup()
+        self.interaction.messages.append(content)
+        if view is not None:
+            self.interaction.view = view
+        message = FakeMessage(embed, view)
+        self.interaction.channel.messages[message.id] = message
+        return message
+
+
+class FakeInteraction:
+    """
+    A fake discord.Interaction that records when it was first responded to
+    (including a defer) and when the user first saw an answer.
+    """
+    def __init__(self, user: FakeMember, guild: FakeGuild,
+                 message: Optional[FakeMessage] = None):
+        self.user = user
+        self.guild = guild
+        self.channel = guild.channel
+        self.message = message
+        self.client = FakeClient()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+        self.created = time.perf_counter()
+        self.first_response: Optional[float] = None
+        self.first_followup: Optional[float] = None
+        self.messages: list[str] = []
+        self.view = None
+
+    async def edit_original_response(self, **kwargs):
+        self.mark_followup()
+        await self.message.edit(**kwargs)
+
+    def mark_response(self):
+        if self.first_response is None:
+            self.first_response = time.perf_counter() - self.created
+
+    def mark_followup(self):
+        if self.first_followup is None:
+            self.first_followup = time.perf_counter() - self.created
+
+
+def use_worksheet(wks: FakeWorksheet) -> None:
+    """Make the Sheets storage backend read and write <wks>."""
+    utils.storage.get_worksheet = lambda **kwargs: wks
+    utils.storage._storage = utils.storage.SheetsBackend()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def write_roster(team_count: int) -> dict[str, FakeMember]:
+    """Write a roster of <team_count> solo players to the working directory."""
+    members = {}
+    with open('players.csv', 'w') as f:
+        f.write('Team Name,Captain osu! Username,Captain Discord Username\n')
+        for i in range(team_count):
+            f.write(f'team{i},osu{i},discord{i}\n')
+            members[f'discord{i}'] = FakeMember(i + 1, f'discord{i}')
+    with open('refs.csv', 'w') as f:
+        f.write('osu! Username,Discord Username\n')
+    reload_rosters()
+    return members
+
+
+def fill_qual_sheet(wks: FakeWorksheet, lobby_count: int) -> list[str]:
+    """Write <lobby_count> empty qualifier lobbies and return their ids."""
+    projection = get_qual_projection()
+    range_ = SheetRange(QUAL_RANGE)
+    spans = projection.spans()
+    ids = []
+    for i in range(lobby_count):
+        row = int(range_.start_row) + i
+        if row > int(range_.end_row):
+            break
+        ids.append(f'Q{i + 1}')
+        wks.values[(row, col_to_number(spans['id'][0]))] = ids[-1]
+        wks.values[(row, col_to_number(spans['date'][0]))] = 45157
+        wks.values[(row, col_to_number(spans['time'][0]))] = 0.5
+    return ids
+
+
+def fill_match_sheet(wks: FakeWorksheet, team_count: int) -> list[str]:
+    """Pair up the teams into bracket matches and return their ids."""
+    projection = get_match_projection()
+    range_ = SheetRange(BSTAGE_RANGE)
+    spans = projection.spans()
+    ids = []
+    for i in range(team_count // 2):
+        row = int(range_.start_row) + i
+        if row > int(range_.end_row):
+            break
+        ids.append(str(i + 1))
+        wks.values[(row, col_to_number(spans['id'][0]))] = ids[-1]
+        wks.values[(row, col_to_number(spans['date'][0]))] = 45157
+        wks.values[(row, col_to_number(spans['time'][0]))] = 0.5
+        wks.values[(row, col_to_number(spans['p1'][0]))] = f'team{2 * i}'
+        wks.values[(row, col_to_number(spans['p2'][0]))] = f'team{2 * i + 1}'
+    return ids
+
+
+async def run_qualifier(concurrency: int, latency: float,
+                        lobby_count: int) -> dict:
+    members = write_roster(concurrency)
+    guild = FakeGuild(members)
+    wks = FakeWorksheet(latency)
+    lobby_ids = fill_qual_sheet(wks, lobby_count)
+    use_worksheet(wks)
+
+    cog = Qualifier(None)
+    interactions = [
+        FakeInteraction(members[f'discord{i}'], guild)
+        for i in range(concurrency)
+    ]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        cog.set_.callback(cog, interaction,
+                          lobby_ids[i % len(lobby_ids)])
+        for i, interaction in enumerate(interactions)
+    ])
+    elapsed = time.perf_counter() - start
+
+    # every player told they signed up should be on the sheet exactly once
+    signed_up = {
+        f'team{i}' for i, interaction in enumerate(interactions)
+        if 'successfully' in interaction.messages[-1]
+    }
+    on_sheet = Counter(v for v in wks.values.values() if v in signed_up)
+    lost = len(signed_up - set(on_sheet))
+
+    return {
+        'elapsed': elapsed,
+        'ttfr': [i.first_response for i in interactions],
+        'ttff': [i.first_followup for i in interactions],
+        'lost': lost,
+        'reads': wks.reads,
+        'writes': wks.writes
+    }
+
+
+async def run_reschedule(concurrency: int, latency: float) -> dict:
+    team_count = concurrency * 2
+    members = write_roster(team_count)
+    guild = FakeGuild(members)
+    wks = FakeWorksheet(latency)
+    match_ids = fill_match_sheet(wks, team_count)
+    use_worksheet(wks)
+
+    cog = Reschedule(None)
+    requests = [
+        FakeInteraction(members[f'discord{2 * i}'], guild)
+        for i in range(len(match_ids))
+    ]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        cog.reschedule.callback(cog, interaction, match_id,
+                                Weekday.Monday, 18, 0)
+        for interaction, match_id in zip(requests, match_ids)
+    ])
+
+    # all at once, a third of the opponents accept, a third decline
+    # and the senders of the rest cancel
+    sent = [r for r in requests if r.view is not None]
+    accepted = sent[0::3]
+    clicks = [
+        (request.view.accept, request.view.receiver, request.view.message)
+        for request in accepted
+    ]
+    clicks += [
+        (request.view.decline, request.view.receiver, request.view.message)
+        for request in sent[1::3]
+    ]
+    clicks += [
+        (request.view.cancel, request.view.sender, request.view.message)
+        for request in sent[2::3]
+    ]
+    click_interactions = [
+        FakeInteraction(members[user.name], guild, message)
+        for _, user, message in clicks
+    ]
+    await asyncio.gather(*[
+        button.callback(interaction)
+        for (button, _, _), interaction in zip(clicks, click_interactions)
+    ])
+    elapsed = time.perf_counter() - start
+
+    # every accepted match should have its new date written to the sheet
+    date_col = col_to_number(get_match_projection().spans()['date'][0])
+    lost = sum(
+        1 for request in accepted
+        if not isinstance(
+            wks.values.get((request.view.match.sheet_row, date_col)), str
+        )
+    )
+
+    interactions = requests + click_interactions
+    return {
+        'elapsed': elapsed,
+        'ttfr': [i.first_response for i in interactions],
+        'ttff': [i.first_followup for i in interactions],
+        'lost': lost,
+        'reads': wks.reads,
+        'writes': wks.writes
+    }
+
+
+async def main(args: argparse.Namespace):
+    print(f'scenario={args.scenario} latency={args.latency}s')
+    # ttfr is the time until Discord is first answered, e.g. by a defer,
+    # ttff the time until the user sees a reply
+    print(f"{'conc':>5} {'ops/s':>8} {'p50 ttfr':>9} {'p99 ttfr':>9} "
+          f"{'p50 ttff':>9} {'p99 ttff':>9} "
+          f"{'lost':>5} {'reads':>6} {'writes':>6}")
+
+    concurrency = 1
+    while concurrency <= args.max_concurrency:
+        if args.scenario == 'qualifier':
+            res = await run_qualifier(concurrency, args.latency, args.lobbies)
+        else:
+            res = await run_reschedule(concurrency, args.latency)
+
+        ttfr = [t for t in res['ttfr'] if t is not None]
+        ttff = [t for t in res['ttff'] if t is not None]
+        print(f"{concurrency:>5} {concurrency / res['elapsed']:>8.2f} "
+              f"{percentile(ttfr, 50):>8.3f}s {percentile(ttfr, 99):>8.3f}s "
+              f"{percentile(ttff, 50):>8.3f}s {percentile(ttff, 99):>8.3f}s "
+              f"{res['lost']:>5} {res['reads']:>6} {res['writes']:>6}")
+
+        concurrency *= 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scenario', choices=['qualifier', 'reschedule'],
+                        default='qualifier')
+    parser.add_argument('--latency', type=float, default=0.3,
+                        help='simulated seconds per Sheets API call')
+    parser.add_argument('--max-concurrency', type=int, default=64)
+    parser.add_argument('--lobbies', type=int, default=4,
+                        help='qualifier lobbies the players contend for')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(main(args))
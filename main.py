@@ -1,16 +1,31 @@
 import discord
 from discord.ext import commands
-import asyncio
 
+import asyncio
+import logging
 import os
+import config
+from utils.scheduler import missing_id_columns
+from utils.storage import get_storage
 from env import BOT_TOKEN, BOT_TEST_SERVER, RGR_SERVER
 
+logger = logging.getLogger(__name__)
+
+# optional, see the README
+MEMBER_INTENT = getattr(config, 'MEMBER_INTENT', True)
+
 
 class Bot(commands.Bot):
     def __init__(self):
 
+        # without the members intent, members are looked up by the
+        # Discord IDs in the rosters instead of being cached
         intents = discord.Intents.default()
-        intents.members = True
+        intents.members = MEMBER_INTENT
+        member_cache_flags = (
+            discord.MemberCacheFlags.from_intents(intents) if MEMBER_INTENT
+            else discord.MemberCacheFlags.none()
+        )
         activity = discord.Activity(
             name='your reschedules',
             type=discord.ActivityType.watching
@@ -19,18 +34,50 @@ class Bot(commands.Bot):
         super().__init__(
             command_prefix='-',
             intents=intents,
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=MEMBER_INTENT,
             activity=activity,
             help_command=None
         )
 
-        asyncio.run(self.load_cogs())
+        # extension name -> modification time of its file when loaded
+        self.extension_mtimes: dict[str, float] = {}
+        self.config_mtime = os.path.getmtime(config.__file__)
 
         self.synced = False
 
+    async def setup_hook(self):
+        if not MEMBER_INTENT:
+            for path, column in missing_id_columns():
+                logger.warning(
+                    f'The members intent is off, but {path} has no '
+                    f'{column!r} column, so nobody in it can be looked up'
+                )
+
+        # the local backend is seeded from the spreadsheet the first time
+        try:
+            await asyncio.to_thread(get_storage().prepare)
+        except Exception:
+            logger.exception(
+                'Could not prepare the storage backend, '
+                'use /storage import once the spreadsheet can be read'
+            )
+
+        # cogs start background tasks when loaded, so they have to be
+        # loaded on the loop the bot runs on
+        await self.load_cogs()
+
     async def load_cogs(self):
         for filename in os.listdir('./cogs'):
             if filename.endswith('.py'):
-                await self.load_extension(f'cogs.{filename[:-3]}')
+                # one broken cog shouldn't take the others down with it
+                try:
+                    await self.load_extension(f'cogs.{filename[:-3]}')
+                except commands.ExtensionError:
+                    logger.exception('Could not load cogs.%s', filename[:-3])
+                    continue
+                self.extension_mtimes[f'cogs.{filename[:-3]}'] = \
+                    os.path.getmtime(f'./cogs/{filename}')
 
     async def on_ready(self):
         await self.wait_until_ready()
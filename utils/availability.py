@@ -0,0 +1,173 @@
+import heapq
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+SLOTS_PER_DAY = 24 * SLOTS_PER_HOUR
+
+
+def weekly_bits(stage_days: list[datetime],
+                weekday: int,
+                start_hour: int,
+                end_hour: int) -> int:
+    """
+    Return the availability bitset of every slot from <start_hour> up to
+    <end_hour> (UTC) on <weekday> of the stage spanning <stage_days>.
+
+    Bit i of a bitset is the i-th 15-minute slot since the stage started.
+    """
+    start_slot = start_hour * 60 // SLOT_MINUTES
+    end_slot = end_hour * 60 // SLOT_MINUTES
+    day_bits = ((1 << (end_slot - start_slot)) - 1) << start_slot
+
+    bits = 0
+    for i, day in enumerate(stage_days):
+        if day.weekday() == weekday:
+            bits |= day_bits << (i * SLOTS_PER_DAY)
+    return bits
+
+
+def full_bits(stage_days: list[datetime]) -> int:
+    """Return the bitset of every slot of the stage spanning <stage_days>."""
+    return (1 << (len(stage_days) * SLOTS_PER_DAY)) - 1
+
+
+def slot_to_dt(stage_days: list[datetime], slot: int) -> datetime:
+    """Return the start time of <slot> in the stage spanning <stage_days>."""
+    start = stage_days[0].replace(tzinfo=timezone.utc)
+    return start + timedelta(minutes=slot * SLOT_MINUTES)
+
+
+def dt_to_slot(stage_days: list[datetime], dt: datetime) -> float:
+    """
+    Return the (fractional) slot of <dt> in the stage spanning
+    <stage_days>. Naive times are UTC.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - slot_to_dt(stage_days, 0)) / timedelta(minutes=SLOT_MINUTES)
+
+
+def best_slots(bits: int,
+               stage_days: list[datetime],
+               near: datetime,
+               after: datetime,
+               count: int) -> list[datetime]:
+    """
+    Return up to <count> times of the slots set in <bits>,
+    closest to <near> first.
+
+    Slots starting before <after> or less than an hour from <near> are
+    skipped, and at most one slot is taken from each hour of the stage,
+    so every time offered is a real alternative to <near>.
+    """
+    near_slot = dt_to_slot(stage_days, near)
+
+    # drop the slots that already started
+    first = max(0, math.ceil(dt_to_slot(stage_days, after)))
+    bits &= ~((1 << first) - 1)
+
+    # and the ones that are barely a move away from <near>
+    lo = max(0, math.floor(near_slot - SLOTS_PER_HOUR) + 1)
+    hi = max(lo, math.ceil(near_slot + SLOTS_PER_HOUR))
+    bits &= ~(((1 << (hi - lo)) - 1) << lo)
+
+    # the slot of each hour that is closest to <near>
+    candidates = []
+    hour_mask = (1 << SLOTS_PER_HOUR) - 1
+    for hour in range(bits.bit_length() // SLOTS_PER_HOUR + 1):
+        hour_bits = (bits >> (hour * SLOTS_PER_HOUR)) & hour_mask
+        if not hour_bits:
+            continue
+        slots = [
+            hour * SLOTS_PER_HOUR + i for i in range(SLOTS_PER_HOUR)
+            if hour_bits >> i & 1
+        ]
+        candidates.append(min(slots, key=lambda s: abs(s - near_slot)))
+
+    best = heapq.nsmallest(
+        count, candidates, key=lambda s: abs(s - near_slot)
+    )
+    return [slot_to_dt(stage_days, slot) for slot in best]
+
+
+def team_key(team_name: str) -> str:
+    return f'team:{team_name}'
+
+
+def ref_key(osu_name: str) -> str:
+    return f'ref:{osu_name}'
+
+
+class AvailabilityStore:
+    """
+    Weekly availability bitsets of teams and referees for each stage,
+    persisted to the JSON file at <path>.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # owner key -> stage -> bitset
+        self.bits: dict[str, dict[str, int]] = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.bits = {
+                    owner: {stage: int(b, 16) for stage, b in stages.items()}
+                    for owner, stages in json.load(f).items()
+                }
+
+    def get(self, owner: str, stage: str) -> Optional[int]:
+        """Return the bitset of <owner> for <stage>, if registered."""
+        return self.bits.get(owner, {}).get(stage)
+
+    def add(self, owner: str, stage: str, bits: int) -> None:
+        """Mark the slots in <bits> as available for <owner>."""
+        stages = self.bits.setdefault(owner, {})
+        stages[stage] = stages.get(stage, 0) | bits
+        self.save()
+
+    def clear(self, owner: str, stage: str) -> None:
+        """Forget the availability of <owner> for <stage>."""
+        self.bits.get(owner, {}).pop(stage, None)
+        self.save()
+
+    def save(self) -> None:
+        data = {
+            owner: {stage: hex(b) for stage, b in stages.items()}
+            for owner, stages in self.bits.items()
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def common_availability(store: AvailabilityStore,
+                        stage: str,
+                        required: list[str],
+                        optional: list[str]) -> Optional[int]:
+    """
+    Return the slots of <stage> in which every owner in <required> and
+    every registered owner in <optional> is available, or None if an
+    owner in <required> hasn't registered their availability.
+    """
+    bits = -1  # every bit set
+    for owner in required:
+        owner_bits = store.get(owner, stage)
+        if owner_bits is None:
+            return
+        bits &= owner_bits
+
+    for owner in optional:
+        owner_bits = store.get(owner, stage)
+        if owner_bits is not None:
+            bits &= owner_bits
+
+    return bits
+
+
+availability_store = AvailabilityStore('weekly_availability.json')
@@ -0,0 +1,251 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from utils.models import QualifierLobby, BracketMatch
+from utils.availability import team_key, ref_key
+
+# how long a lobby is blocked out in calendars
+EVENT_DURATION = timedelta(hours=1)
+
+
+def as_utc(dt: datetime) -> datetime:
+    """Return <dt> in UTC. Naive times are already UTC."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def format_dt(dt: datetime) -> str:
+    """Return <dt> as an iCalendar UTC date-time."""
+    return as_utc(dt).strftime('%Y%m%dT%H%M%SZ')
+
+
+def escape(text: str) -> str:
+    """Escape <text> for use as an iCalendar TEXT value."""
+    return (
+        text.replace('\\', '\\\\')
+            .replace(';', '\\;')
+            .replace(',', '\\,')
+            .replace('\n', '\\n')
+    )
+
+
+def fold(line: str) -> str:
+    """Split <line> into lines of at most 75 octets, as RFC 5545 requires."""
+    parts = []
+    part = ''
+    size = 0
+    for char in line:
+        char_size = len(char.encode())
+        # continuation lines start with a space, which counts too
+        if size + char_size > 75:
+            parts.append(part)
+            part = ' '
+            size = 1
+        part += char
+        size += char_size
+    parts.append(part)
+    return '\r\n'.join(parts)
+
+
+def qual_uid(lobby_id: str) -> str:
+    """Return the UID of the event of qualifier lobby <lobby_id>."""
+    return f'qual-{lobby_id}@upranker'
+
+
+def match_uid(match_id: str) -> str:
+    """Return the UID of the event of match <match_id>."""
+    return f'match-{match_id}@upranker'
+
+
+def render_event(uid: str,
+                 start: datetime,
+                 summary: str,
+                 description: str,
+                 sequence: int,
+                 stamp: datetime) -> str:
+    """Return the VEVENT of a lobby, ending with a line break."""
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'SEQUENCE:{sequence}',
+        f'DTSTAMP:{format_dt(stamp)}',
+        f'DTSTART:{format_dt(start)}',
+        f'DTEND:{format_dt(start + EVENT_DURATION)}',
+        f'SUMMARY:{escape(summary)}',
+        f'DESCRIPTION:{escape(description)}',
+        'END:VEVENT'
+    ]
+    return ''.join(f'{fold(line)}\r\n' for line in lines)
+
+
+class Event:
+    """A rendered VEVENT and the owner keys whose feeds include it."""
+    def __init__(self, start: datetime, summary: str, description: str,
+                 owners: frozenset[str], sequence: int, text: str):
+        self.start = start
+        self.summary = summary
+        self.description = description
+        self.owners = owners
+        self.sequence = sequence
+        self.text = text
+
+
+class CalendarFeeds:
+    """
+    iCalendar feeds of the whole tournament and of each team and referee
+    (keyed like the availability owners, e.g. 'team:<name>').
+
+    Each lobby's VEVENT is rendered once and kept until the lobby changes.
+    A feed is only rebuilt when one of its events changed since it was
+    last served.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        # uid -> event
+        self._events: dict[str, Event] = {}
+        # owner key -> uids of their events
+        self._by_owner: dict[str, set[str]] = {}
+        # owner key (None for the whole tournament) -> (body, etag)
+        self._feeds: dict[Optional[str], tuple[bytes, str]] = {}
+
+    def replace_all(self,
+                    qual_lobbies: list[QualifierLobby],
+                    matches: list[BracketMatch]) -> None:
+        """
+        Make the events those of <qual_lobbies> and <matches>.
+        Feeds whose events didn't change stay cached.
+        """
+        for lobby in qual_lobbies:
+            self.set_qual_lobby(lobby)
+        for match in matches:
+            self.set_match(match)
+
+        current = {qual_uid(lobby.id) for lobby in qual_lobbies if lobby.id}
+        current |= {match_uid(match.id) for match in matches if match.id}
+        for uid in set(self._events) - current:
+            self._remove(uid)
+
+    def set_qual_lobby(self, lobby: QualifierLobby) -> None:
+        """Add or update the event of the qualifier <lobby>."""
+        if not lobby.id:
+            return
+        teams = [p.team_name for p in lobby.players]
+        owners = {team_key(team) for team in teams}
+        description = f'Teams: {", ".join(teams) or "none yet"}'
+        if lobby.referee:
+            owners.add(ref_key(lobby.referee.osu_name))
+            description += f'\nReferee: {lobby.referee.osu_name}'
+
+        self._put(
+            uid=qual_uid(lobby.id),
+            start=lobby.time,
+            summary=f'Qualifier lobby {lobby.id}',
+            description=description,
+            owners=frozenset(owners)
+        )
+
+    def set_match(self,
+                  match: BracketMatch,
+                  time: Optional[datetime] = None) -> None:
+        """
+        Add or update the event of <match>, starting at <time>
+        if it has been rescheduled.
+        """
+        if not match.id:
+            return
+        players = [p for p in (match.player1, match.player2) if p is not None]
+        owners = {team_key(p.team_name) for p in players}
+        p1 = match.player1.team_name if match.player1 else 'TBD'
+        p2 = match.player2.team_name if match.player2 else 'TBD'
+        description = f'Match {match.id}'
+        if match.referee:
+            owners.add(ref_key(match.referee.osu_name))
+            description += f'\nReferee: {match.referee.osu_name}'
+
+        self._put(
+            uid=match_uid(match.id),
+            start=time or match.time,
+            summary=f'{p1} vs {p2}',
+            description=description,
+            owners=frozenset(owners)
+        )
+
+    def feed(self, owner: Optional[str] = None) -> tuple[bytes, str]:
+        """
+        Return the body and ETag of the feed of <owner>,
+        or of the whole tournament if <owner> is None.
+        """
+        if owner in self._feeds:
+            return self._feeds[owner]
+
+        if owner is None:
+            events = self._events.values()
+        else:
+            events = [self._events[uid]
+                      for uid in self._by_owner.get(owner, ())]
+
+        body = ''.join([
+            'BEGIN:VCALENDAR\r\n',
+            'VERSION:2.0\r\n',
+            'PRODID:-//upranker//schedule//EN\r\n',
+            f'{fold(f"X-WR-CALNAME:{escape(self.name)}")}\r\n',
+            *(e.text for e in sorted(events, key=lambda e: e.start)),
+            'END:VCALENDAR\r\n'
+        ]).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        # unknown owners get an empty feed, but aren't worth caching
+        if owner is None or owner in self._by_owner:
+            self._feeds[owner] = (body, etag)
+        return body, etag
+
+    def _put(self, uid: str, start: datetime, summary: str,
+             description: str, owners: frozenset[str]) -> None:
+        start = as_utc(start)
+        old = self._events.get(uid)
+        if old is not None and (
+                (old.start, old.summary, old.description, old.owners)
+                == (start, summary, description, owners)):
+            return
+
+        sequence = old.sequence + 1 if old else 0
+        self._events[uid] = Event(
+            start=start,
+            summary=summary,
+            description=description,
+            owners=owners,
+            sequence=sequence,
+            text=render_event(
+                uid=uid,
+                start=start,
+                summary=summary,
+                description=description,
+                sequence=sequence,
+                stamp=datetime.now(timezone.utc)
+            )
+        )
+
+        old_owners = old.owners if old else frozenset()
+        for owner in old_owners - owners:
+            self._by_owner[owner].discard(uid)
+            if not self._by_owner[owner]:
+                del self._by_owner[owner]
+        for owner in owners:
+            self._by_owner.setdefault(owner, set()).add(uid)
+
+        # only the feeds that include the event need rebuilding
+        self._feeds.pop(None, None)
+        for owner in owners | old_owners:
+            self._feeds.pop(owner, None)
+
+    def _remove(self, uid: str) -> None:
+        event = self._events.pop(uid)
+        for owner in event.owners:
+            self._by_owner[owner].discard(uid)
+            if not self._by_owner[owner]:
+                del self._by_owner[owner]
+
+        self._feeds.pop(None, None)
+        for owner in event.owners:
+            self._feeds.pop(owner, None)
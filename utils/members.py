@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Optional
+import discord
+
+
+class MemberLookup:
+    """
+    A bounded LRU cache of guild members looked up by Discord ID,
+    for when the bot runs without the members intent and member cache.
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._members: OrderedDict[tuple[int, int], discord.Member] = \
+            OrderedDict()
+
+    async def get(self,
+                  guild: discord.Guild,
+                  discord_id: Optional[int],
+                  discord_name: str) -> Optional[discord.Member]:
+        """
+        Return the member of <guild> with <discord_id>, fetching it from
+        Discord if it hasn't been looked up recently.
+
+        Without a <discord_id>, fall back to searching the member cache
+        for <discord_name>, which only works with the members intent.
+        """
+        if discord_id is None:
+            return guild.get_member_named(discord_name)
+
+        key = (guild.id, discord_id)
+        if key in self._members:
+            self._members.move_to_end(key)
+            return self._members[key]
+
+        member = guild.get_member(discord_id)
+        if member is None:
+            # not in the server, or Discord didn't let us look. either way
+            # callers treat them as not found, and the next lookup retries
+            try:
+                member = await guild.fetch_member(discord_id)
+            except discord.HTTPException:
+                return
+
+        self._members[key] = member
+        if len(self._members) > self.maxsize:
+            self._members.popitem(last=False)
+        return member
+
+
+member_lookup = MemberLookup()
@@ -13,10 +13,12 @@ class Player:
     In a team setting, <osu_name> and <discord_id> should be
     the osu! username and Discord ID of the team captain, respectively.
     """
-    def __init__(self, team_name: str, osu_name: str, discord_name: str):
+    def __init__(self, team_name: str, osu_name: str, discord_name: str,
+                 discord_id: Optional[int] = None):
         self.team_name = team_name
         self.osu_name = osu_name
         self.discord_name = discord_name
+        self.discord_id = discord_id
 
     def __eq__(self, other: Player) -> bool:
         return (
@@ -28,9 +30,11 @@ class Player:
 
 class Referee:
     """An osu! tournament referee."""
-    def __init__(self, osu_name: str, discord_name: str):
+    def __init__(self, osu_name: str, discord_name: str,
+                 discord_id: Optional[int] = None):
         self.osu_name = osu_name
         self.discord_name = discord_name
+        self.discord_id = discord_id
 
 
 class Lobby:
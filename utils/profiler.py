@@ -0,0 +1,124 @@
+import asyncio
+import cProfile
+import contextvars
+import functools
+import io
+import os
+import pstats
+import sys
+from datetime import datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar('T')
+
+PROFILE_DIR = 'profiles'
+
+# command name -> number of invocations left to profile
+armed: dict[str, int] = {}
+
+# only one profiler can be active at a time
+_active: Optional[cProfile.Profile] = None
+
+# profiles of the worker threads started by the invocation being profiled.
+# to_thread() copies the context, so the threads can see it
+_thread_profiles: contextvars.ContextVar[Optional[list[cProfile.Profile]]] = \
+    contextvars.ContextVar('thread_profiles', default=None)
+
+
+def arm(command_name: str, count: int) -> None:
+    """Profile the next <count> invocations of <command_name>."""
+    armed[command_name] = count
+
+
+def disarm(command_name: str) -> None:
+    """Stop profiling <command_name>."""
+    armed.pop(command_name, None)
+
+
+async def to_thread(func: Callable[..., T], /, *args, **kwargs) -> T:
+    """
+    Like asyncio.to_thread, but <func> is profiled as well when it's
+    called from an invocation that is being profiled.
+
+    Before Python 3.12, cProfile only sees the thread it was enabled in,
+    so work moved to a worker thread would otherwise be missing from the
+    profile. Since 3.12 it sees every thread, and enabling a second one
+    while it's active raises ValueError.
+    """
+    profiles = _thread_profiles.get()
+    if profiles is None or sys.version_info >= (3, 12):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def run() -> T:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            profiles.append(profile)
+
+    return await asyncio.to_thread(run)
+
+
+def write_profile(profile: cProfile.Profile,
+                  command_name: str,
+                  thread_profiles: list[cProfile.Profile] = ()) -> str:
+    """
+    Write <profile>, merged with the <thread_profiles> of the worker
+    threads it started, and a summary of its top functions to
+    PROFILE_DIR. Return the path of the summary.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    base = os.path.join(
+        PROFILE_DIR, f"{command_name.replace(' ', '_')}-{stamp}"
+    )
+    summary = io.StringIO()
+    stats = pstats.Stats(profile, *thread_profiles, stream=summary)
+    stats.dump_stats(f'{base}.prof')
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(30)
+    with open(f'{base}.txt', 'w') as f:
+        f.write(summary.getvalue())
+
+    return f'{base}.txt'
+
+
+def profiled(command_name: str):
+    """
+    Profile the decorated coroutine while <command_name> is armed.
+
+    Everything running in the event loop between the invocation's awaits
+    is profiled too, so concurrent commands may show up in the results.
+    Work it hands to worker threads is only profiled if it uses to_thread()
+    from this module.
+    """
+    def decorator(func: Callable[..., Awaitable]):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            global _active
+
+            # the only cost while profiling is off
+            if command_name not in armed or _active is not None:
+                return await func(*args, **kwargs)
+
+            armed[command_name] -= 1
+            if armed[command_name] <= 0:
+                disarm(command_name)
+
+            thread_profiles: list[cProfile.Profile] = []
+            token = _thread_profiles.set(thread_profiles)
+            _active = profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.disable()
+                _active = None
+                _thread_profiles.reset(token)
+                write_profile(profile, command_name, thread_profiles)
+
+        return wrapper
+
+    return decorator
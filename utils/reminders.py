@@ -0,0 +1,141 @@
+from __future__ import annotations
+import heapq
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from utils.models import BracketMatch
+
+
+class Reminder:
+    """
+    A pending reminder for a bracket match.
+
+    <mentions> are the Discord usernames and IDs (if known)
+    of the match's players and referee.
+    """
+    def __init__(self, match_id: str, remind_at: datetime,
+                 mentions: list[tuple[str, Optional[int]]]):
+        self.match_id = match_id
+        self.remind_at = remind_at
+        self.mentions = mentions
+
+    def to_dict(self) -> dict:
+        return {
+            'match_id': self.match_id,
+            'remind_at': self.remind_at.timestamp(),
+            'mentions': self.mentions
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Reminder:
+        return cls(
+            match_id=data['match_id'],
+            remind_at=datetime.fromtimestamp(data['remind_at'], timezone.utc),
+            mentions=[
+                tuple(m) if isinstance(m, list) else (m, None)
+                for m in data['mentions']
+            ]
+        )
+
+
+def reminder_from_match(match: BracketMatch,
+                        offset: timedelta) -> Reminder:
+    """Create the Reminder for <match>, sent <offset> before it starts."""
+    mentions = [
+        (p.discord_name, p.discord_id)
+        for p in (match.player1, match.player2, match.referee)
+        if p is not None
+    ]
+    return Reminder(
+        match_id=match.id,
+        remind_at=match.time - offset,
+        mentions=mentions
+    )
+
+
+class ReminderQueue:
+    """
+    A min-heap of pending reminders ordered by their send time,
+    persisted to the JSON file at <path>.
+
+    Rescheduling a reminder pushes a new heap entry and leaves the old one
+    behind; stale entries are skipped when they reach the top of the heap.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # heap entries are (timestamp, sequence number, match id)
+        self._heap: list[tuple[float, int, str]] = []
+        # match id -> (sequence number of its live heap entry, reminder)
+        self._live: dict[str, tuple[int, Reminder]] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def push(self, reminder: Reminder) -> None:
+        """Add <reminder>, replacing any pending one for the same match."""
+        self._seq += 1
+        self._live[reminder.match_id] = (self._seq, reminder)
+        heapq.heappush(
+            self._heap,
+            (reminder.remind_at.timestamp(), self._seq, reminder.match_id)
+        )
+
+        # rebuild once stale entries make up most of the heap
+        if len(self._heap) > 2 * len(self._live) + 16:
+            self._compact()
+
+    def remove(self, match_id: str) -> None:
+        """Drop the pending reminder for <match_id>, if any."""
+        self._live.pop(match_id, None)
+
+    def next_time(self) -> Optional[datetime]:
+        """Return when the earliest pending reminder is due."""
+        self._discard_stale()
+        if not self._heap:
+            return
+        return datetime.fromtimestamp(self._heap[0][0], timezone.utc)
+
+    def pop_due(self, now: datetime) -> list[Reminder]:
+        """Remove and return every reminder due at or before <now>."""
+        due: list[Reminder] = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now.timestamp():
+                break
+            _, _, match_id = heapq.heappop(self._heap)
+            due.append(self._live.pop(match_id)[1])
+        return due
+
+    def save(self) -> None:
+        """Write the pending reminders to <self.path>."""
+        data = [reminder.to_dict() for _, reminder in self._live.values()]
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> None:
+        """Read the pending reminders saved in <self.path>, if it exists."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for data in json.load(f):
+                self.push(Reminder.from_dict(data))
+
+    def _discard_stale(self) -> None:
+        """Pop heap entries that no longer belong to a pending reminder."""
+        while self._heap:
+            _, seq, match_id = self._heap[0]
+            live = self._live.get(match_id)
+            if live is not None and live[0] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self) -> None:
+        self._heap = [
+            (reminder.remind_at.timestamp(), seq, match_id)
+            for match_id, (seq, reminder) in self._live.items()
+        ]
+        heapq.heapify(self._heap)
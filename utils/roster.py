@@ -0,0 +1,187 @@
+import heapq
+import math
+import os
+from bisect import bisect_left, bisect_right
+import pandas as pd
+from typing import Optional, Union
+
+# path -> (modification time when read, contents)
+_cache: dict[str, tuple[float, pd.DataFrame]] = {}
+
+
+def load_csv(path: str) -> pd.DataFrame:
+    """
+    Return the contents of the CSV file at <path> as strings,
+    reading it only the first time it is requested.
+    """
+    if path not in _cache:
+        _cache[path] = (os.path.getmtime(path), pd.read_csv(path, dtype=str))
+    return _cache[path][1]
+
+
+def reload_rosters() -> list[str]:
+    """
+    Re-read every cached CSV file that has changed on disk since it was
+    read. Return the paths of the files that were re-read.
+    """
+    reloaded = []
+    for path, (mtime, _) in list(_cache.items()):
+        new_mtime = os.path.getmtime(path)
+        if new_mtime != mtime:
+            _cache[path] = (new_mtime, pd.read_csv(path, dtype=str))
+            reloaded.append(path)
+    return reloaded
+
+
+def discord_id(value) -> Optional[int]:
+    """
+    Return the Discord ID in the roster cell <value>, or None if
+    the roster has no Discord IDs or the cell is empty.
+    """
+    if not isinstance(value, str) or not value.strip().isdigit():
+        return
+    return int(value)
+
+
+class AmbiguousTeamName(Exception):
+    """The team name is similar to more than one team in the roster."""
+    def __init__(self, name: str, candidates: list[str]):
+        super().__init__(
+            f'{name!r} could be any of: {", ".join(candidates)}'
+        )
+        self.name = name
+        self.candidates = candidates
+
+
+def normalize(name) -> str:
+    """Return <name> without case or extra whitespace."""
+    return ' '.join(str(name).split()).casefold()
+
+
+def trigrams(key: str) -> set[str]:
+    """Return the trigrams of <key>, padded so short names have some."""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TeamIndex:
+    """
+    An index of the team names in a roster that also resolves names
+    with different casing, stray whitespace or small typos.
+    """
+    # minimum Dice similarity of the trigrams for a near-miss name
+    MIN_SIMILARITY = 0.6
+    # near-misses scoring within this of the best one are ambiguous
+    AMBIGUITY_MARGIN = 0.05
+    # the most ambiguous candidates reported
+    MAX_CANDIDATES = 10
+
+    def __init__(self, team_names: list):
+        # normalized name -> row positions of the teams with that name
+        self.rows: dict[str, list[int]] = {}
+        # normalized name -> its trigrams
+        self.key_grams: dict[str, frozenset[str]] = {}
+        # trigram -> normalized names containing it, fewest trigrams first
+        self.grams: dict[str, list[str]] = {}
+        # trigram -> number of trigrams in each of those names
+        self.gram_lens: dict[str, list[int]] = {}
+        # query -> resolved normalized name, or the ambiguous candidates
+        self._resolved: dict[str, Union[Optional[str], list[str]]] = {}
+
+        for i, name in enumerate(team_names):
+            key = normalize(name)
+            if key not in self.rows:
+                self.rows[key] = []
+                self.key_grams[key] = frozenset(trigrams(key))
+            self.rows[key].append(i)
+
+        for key in sorted(self.key_grams, key=lambda k: len(self.key_grams[k])):
+            for gram in self.key_grams[key]:
+                self.grams.setdefault(gram, []).append(key)
+                self.gram_lens.setdefault(gram, []).append(
+                    len(self.key_grams[key])
+                )
+
+    def resolve(self, name) -> list[int]:
+        """
+        Return the row positions of the team named <name>,
+        or an empty list if there is no such team.
+
+        Raise AmbiguousTeamName if <name> is close to several teams.
+        """
+        query = normalize(name)
+        if query in self.rows:
+            return self.rows[query]
+        if not query:
+            return []
+
+        if query not in self._resolved:
+            self._resolved[query] = self._nearest(query)
+
+        res = self._resolved[query]
+        if isinstance(res, list):
+            raise AmbiguousTeamName(str(name), res)
+        return self.rows[res] if res is not None else []
+
+    def _nearest(self, query: str) -> Union[Optional[str], list[str]]:
+        """
+        Return the indexed name most similar to <query>, None if none are
+        similar enough, or every candidate if there is no clear winner.
+        """
+        query_grams = trigrams(query)
+        q = len(query_grams)
+        t = self.MIN_SIMILARITY
+
+        # the Dice similarity 2|Q & K| / (|Q| + |K|) can only reach t
+        # for names with about as many trigrams as the query
+        min_len = math.ceil(q * t / (2 - t) - 1e-9)
+        max_len = math.floor(q * (2 - t) / t + 1e-9)
+        rarest = sorted(
+            query_grams, key=lambda gram: len(self.grams.get(gram, ()))
+        )
+
+        candidates = set()
+        for k in range(min_len, max_len + 1):
+            # a name with k trigrams shares at least min_shared of them with
+            # the query, so it contains one of its q - min_shared + 1 rarest
+            # trigrams. common trigrams like 'tea' never have to be scanned
+            min_shared = math.ceil(t * (q + k) / 2 - 1e-9)
+            for gram in rarest[:q - min_shared + 1]:
+                if gram not in self.grams:
+                    continue
+                lens = self.gram_lens[gram]
+                candidates.update(self.grams[gram][
+                    bisect_left(lens, k):bisect_right(lens, k)
+                ])
+
+        scores = []
+        for key in candidates:
+            key_grams = self.key_grams[key]
+            score = 2 * len(query_grams & key_grams) / (q + len(key_grams))
+            if score >= t:
+                scores.append((score, key))
+        if not scores:
+            return
+
+        top = heapq.nlargest(self.MAX_CANDIDATES, scores)
+        best = top[0][0]
+        candidates = [
+            key for score, key in top
+            if best - score <= self.AMBIGUITY_MARGIN
+        ]
+        return candidates[0] if len(candidates) == 1 else candidates
+
+
+# path -> (contents the index was built from, index)
+_indexes: dict[str, tuple[pd.DataFrame, TeamIndex]] = {}
+
+
+def get_team_index(path: str, column: str) -> TeamIndex:
+    """
+    Return the TeamIndex of <column> in the CSV file at <path>,
+    rebuilding it only when the file has been re-read.
+    """
+    roster = load_csv(path)
+    if path not in _indexes or _indexes[path][0] is not roster:
+        _indexes[path] = (roster, TeamIndex(roster[column].tolist()))
+    return _indexes[path][1]
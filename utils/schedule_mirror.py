@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import datetime, timezone
+from typing import Optional
+from utils.models import Player, Referee, BracketMatch
+
+
+class ScheduleMirror:
+    """
+    A local SQLite copy of the bracket stage schedule, indexed by
+    match time, team and referee so that schedule queries never
+    have to read the spreadsheet.
+    """
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            '''
+            CREATE TABLE IF NOT EXISTS matches (
+                id TEXT PRIMARY KEY,
+                time REAL NOT NULL,
+                p1_team TEXT,
+                p1_osu TEXT,
+                p1_discord TEXT,
+                p2_team TEXT,
+                p2_osu TEXT,
+                p2_discord TEXT,
+                ref_osu TEXT,
+                ref_discord TEXT,
+                sheet_row INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS matches_time ON matches (time);
+            CREATE INDEX IF NOT EXISTS matches_p1 ON matches (p1_team);
+            CREATE INDEX IF NOT EXISTS matches_p2 ON matches (p2_team);
+            CREATE INDEX IF NOT EXISTS matches_ref ON matches (ref_discord);
+            '''
+        )
+
+    def replace_all(self, matches: list[BracketMatch]) -> None:
+        """Replace the mirrored schedule with <matches>."""
+        with self.conn:
+            self.conn.execute('DELETE FROM matches')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO matches '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [_match_to_row(match) for match in matches]
+            )
+
+    def update_time(self, match_id: str, new_time: datetime) -> None:
+        """Change the time of the match with <match_id>."""
+        with self.conn:
+            self.conn.execute(
+                'UPDATE matches SET time = ? WHERE id = ?',
+                (new_time.timestamp(), match_id)
+            )
+
+    def matches_for_team(self, team_name: str) -> list[BracketMatch]:
+        """Return the matches <team_name> plays in, earliest first."""
+        return self._query(
+            'SELECT * FROM matches WHERE p1_team = ? '
+            'UNION SELECT * FROM matches WHERE p2_team = ? '
+            'ORDER BY time',
+            (team_name, team_name)
+        )
+
+    def matches_for_ref(self, discord_name: str) -> list[BracketMatch]:
+        """Return the matches refereed by <discord_name>, earliest first."""
+        return self._query(
+            'SELECT * FROM matches WHERE ref_discord = ? ORDER BY time',
+            (discord_name,)
+        )
+
+    def matches_between(self, start: datetime,
+                        end: datetime) -> list[BracketMatch]:
+        """Return the matches from <start> up to <end>, earliest first."""
+        return self._query(
+            'SELECT * FROM matches WHERE time >= ? AND time < ? '
+            'ORDER BY time',
+            (start.timestamp(), end.timestamp())
+        )
+
+    def _query(self, sql: str, params: tuple) -> list[BracketMatch]:
+        return [
+            _row_to_match(row) for row in self.conn.execute(sql, params)
+        ]
+
+
+def _match_to_row(match: BracketMatch) -> tuple:
+    p1, p2, ref = match.player1, match.player2, match.referee
+    return (
+        match.id,
+        match.time.timestamp(),
+        p1.team_name if p1 else None,
+        p1.osu_name if p1 else None,
+        p1.discord_name if p1 else None,
+        p2.team_name if p2 else None,
+        p2.osu_name if p2 else None,
+        p2.discord_name if p2 else None,
+        ref.osu_name if ref else None,
+        ref.discord_name if ref else None,
+        match.sheet_row
+    )
+
+
+def _row_to_match(row: tuple) -> BracketMatch:
+    def player(team: Optional[str], osu: str, discord: str) \
+            -> Optional[Player]:
+        if team is None:
+            return
+        return Player(team_name=team, osu_name=osu, discord_name=discord)
+
+    return BracketMatch(
+        id=row[0],
+        time=datetime.fromtimestamp(row[1], timezone.utc),
+        player1=player(*row[2:5]),
+        player2=player(*row[5:8]),
+        referee=Referee(row[8], row[9]) if row[8] is not None else None,
+        sheet_row=row[10]
+    )
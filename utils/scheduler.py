@@ -1,17 +1,37 @@
 from datetime import datetime, timedelta, timezone
+from collections import deque
+import logging
 import pandas as pd
 from typing import Optional, Union
 from utils.models import Player, Referee, QualifierLobby, BracketMatch
-from utils.sheets import get_cells
-from utils.sheets import Worksheet, Cell, SheetRange
+from utils.sheets import get_cells, get_cells_batch
+from utils.roster import load_csv, get_team_index, discord_id
+from utils.roster import AmbiguousTeamName
+from utils.sheets import Worksheet, Cell, SheetRange, ColumnProjection
+from utils.sheets import Spreadsheet, range_col
+import config
 from config import (
+    QUAL_RANGE,
     QUAL_DATE_SHEET_COL,
     QUAL_TIME_SHEET_COL,
+    QUAL_SLOTS_COL_START,
+    QUAL_SLOTS_COL_END,
+    BSTAGE_RANGE,
     BSTAGE_DATE_SHEET_COL,
     BSTAGE_TIME_SHEET_COL
 )
-# TODO: combine this and col_idxs into one parameter called config_dict
-# or something, less imports are better
+
+# optional, see the README. without them the columns are where they
+# used to have to be: each range starts with the ID, date, time and
+# referee, and matches then skip a column before the two players
+QUAL_ID_SHEET_COL = getattr(config, 'QUAL_ID_SHEET_COL', None)
+QUAL_REF_SHEET_COL = getattr(config, 'QUAL_REF_SHEET_COL', None)
+BSTAGE_ID_SHEET_COL = getattr(config, 'BSTAGE_ID_SHEET_COL', None)
+BSTAGE_REF_SHEET_COL = getattr(config, 'BSTAGE_REF_SHEET_COL', None)
+BSTAGE_P1_SHEET_COL = getattr(config, 'BSTAGE_P1_SHEET_COL', None)
+BSTAGE_P2_SHEET_COL = getattr(config, 'BSTAGE_P2_SHEET_COL', None)
+
+logger = logging.getLogger(__name__)
 
 
 class LobbyNotFound(Exception):
@@ -34,32 +54,33 @@ class NotMatchParticipant(Exception):
     pass
 
 
-def get_qual_col_order() -> dict[str, int]:
+def get_qual_projection() -> ColumnProjection:
     """
-    Return a dictionary mapping each column name to the index
-    where the data for the column can be found in a row of cells
-    from get_cells().
+    Return the projection of the qualifier columns
+    that are needed from the spreadsheet.
     """
-    # TODO: read this from a config
-    # this is temporary
-    # remembr this function assumes that all the necessary columns are adjacent
-    # to each other in the specified range
-    # force hosts to have players at the end, makes things way simpler
-    # TODO: look into Enum for this?
-    order = ['id', 'date', 'time', 'ref', 'players']
-    player_slots = 8
+    # force hosts to have players in adjacent columns, makes things simpler
+    return ColumnProjection({
+        'id': QUAL_ID_SHEET_COL or range_col(QUAL_RANGE, 0),
+        'date': QUAL_DATE_SHEET_COL,
+        'time': QUAL_TIME_SHEET_COL,
+        'ref': QUAL_REF_SHEET_COL or range_col(QUAL_RANGE, 3),
+        'players': f'{QUAL_SLOTS_COL_START}:{QUAL_SLOTS_COL_END}'
+    })
 
-    res = {col_name: i for i, col_name in enumerate(order)}
-    res['players_end'] = res['players'] + player_slots - 1
-    return res
 
-
-def get_match_col_order() -> dict[str, int]:
+def get_match_projection() -> ColumnProjection:
     """
-    Same as get_qual_col_order() but for bracket matches.
+    Same as get_qual_projection() but for bracket matches.
     """
-    order = ['id', 'date', 'time', 'ref', 'empty_column', 'p1', 'p2']
-    return {col_name: i for i, col_name in enumerate(order)}
+    return ColumnProjection({
+        'id': BSTAGE_ID_SHEET_COL or range_col(BSTAGE_RANGE, 0),
+        'date': BSTAGE_DATE_SHEET_COL,
+        'time': BSTAGE_TIME_SHEET_COL,
+        'ref': BSTAGE_REF_SHEET_COL or range_col(BSTAGE_RANGE, 3),
+        'p1': BSTAGE_P1_SHEET_COL or range_col(BSTAGE_RANGE, 5),
+        'p2': BSTAGE_P2_SHEET_COL or range_col(BSTAGE_RANGE, 6)
+    })
 
 
 def float_to_datetime(float_days: float) -> datetime:
@@ -103,12 +124,20 @@ def get_player_from_csv(team_name: str = None,
     as denoted in the CSV file.
 
     Exactly one of two arguments should be passed.
+    <team_name> may differ from the CSV file in casing, whitespace
+    or a small typo.
     """
-    players = pd.read_csv('players.csv')
+    players = load_csv('players.csv')
 
     # should just be one row from the DataFrame
     if team_name is not None:
-        rows = players[players['Team Name'] == team_name]
+        try:
+            positions = get_team_index('players.csv', 'Team Name') \
+                .resolve(team_name)
+        except AmbiguousTeamName as e:
+            logger.warning(f'Ambiguous team name on the sheet: {e}')
+            return
+        rows = players.iloc[positions]
     elif discord_name is not None:
         rows = players[players['Captain Discord Username'] == discord_name]
 
@@ -120,19 +149,27 @@ def get_player_from_csv(team_name: str = None,
     return Player(
         team_name=rows['Team Name'].item(),
         osu_name=rows['Captain osu! Username'].item(),
-        discord_name=rows['Captain Discord Username'].item()
+        discord_name=rows['Captain Discord Username'].item(),
+        discord_id=discord_id(rows['Captain Discord ID'].item())
+        if 'Captain Discord ID' in rows else None
     )
 
 
-def get_referee_from_csv(osu_name: str) -> Optional[Referee]:
+def get_referee_from_csv(osu_name: str = None,
+                         discord_name: str = None) -> Optional[Referee]:
     """
-    Return the Referee associated with <osu_name> as denoted
-    in the CSV file.
+    Return the Referee associated with <osu_name> or <discord_name>
+    as denoted in the CSV file.
+
+    Exactly one of two arguments should be passed.
     """
-    refs = pd.read_csv('refs.csv')
+    refs = load_csv('refs.csv')
 
     # should just be one row from the DataFrame
-    rows = refs[refs['osu! Username'] == osu_name]
+    if osu_name is not None:
+        rows = refs[refs['osu! Username'] == osu_name]
+    elif discord_name is not None:
+        rows = refs[refs['Discord Username'] == discord_name]
 
     # if not, then that means the entry was not found in the csv file or
     # there is no ref for the match according to the sheet
@@ -142,11 +179,29 @@ def get_referee_from_csv(osu_name: str) -> Optional[Referee]:
         return
 
     return Referee(
-        osu_name=osu_name,
-        discord_name=rows['Discord Username'].item()
+        osu_name=rows['osu! Username'].item(),
+        discord_name=rows['Discord Username'].item(),
+        discord_id=discord_id(rows['Discord ID'].item())
+        if 'Discord ID' in rows else None
     )
 
 
+# the roster columns members are looked up by without the members intent
+ROSTER_ID_COLUMNS = {
+    'players.csv': 'Captain Discord ID',
+    'refs.csv': 'Discord ID'
+}
+
+
+def missing_id_columns() -> list[tuple[str, str]]:
+    """Return the (path, column) of the rosters without a Discord ID column."""
+    return [
+        (path, column)
+        for path, column in ROSTER_ID_COLUMNS.items()
+        if column not in load_csv(path)
+    ]
+
+
 def find_lobby(lobbies: Union[list[QualifierLobby], list[BracketMatch]],
                id_: str) -> Union[QualifierLobby, BracketMatch, None]:
     """Search <lobbies> for the lobby with <id_>."""
@@ -157,19 +212,25 @@ def find_lobby(lobbies: Union[list[QualifierLobby], list[BracketMatch]],
 
 def get_qual_lobbies(worksheet: Worksheet,
                      qual_range: str,
-                     col_idxs: dict[str, int]) -> list[QualifierLobby]:
+                     projection: ColumnProjection) -> list[QualifierLobby]:
     """
     Return a list of the qualifier lobbies in <worksheet>.
     """
-    # TODO: read config file, probably a json (discord security risk?)
-
     cells = get_cells(
         worksheet=worksheet,
         range_=SheetRange(qual_range),
-        col_idxs=col_idxs,
-        date_col=QUAL_DATE_SHEET_COL,
-        time_col=QUAL_TIME_SHEET_COL
+        projection=projection
     )
+    return parse_qual_lobbies(cells, projection)
+
+
+def parse_qual_lobbies(cells: list[list[Cell]],
+                       projection: ColumnProjection) -> list[QualifierLobby]:
+    """
+    Return a list of the qualifier lobbies in <cells>,
+    as fetched with <projection>.
+    """
+    col_idxs = projection.col_idxs
 
     res: list[QualifierLobby] = []
     for row in cells:
@@ -201,13 +262,14 @@ def get_qual_lobbies(worksheet: Worksheet,
     return res
 
 
-def schedule_qual(worksheet: Worksheet,
-                  qual_lobbies: list[QualifierLobby],
-                  match_id: str,
-                  player: Player,
-                  slots_start: str,
-                  slots_end: str) -> QualifierLobby:
-    """Schedule a player into a qualifier lobby."""
+def move_to_qual(qual_lobbies: list[QualifierLobby],
+                 match_id: str,
+                 player: Player) \
+        -> tuple[QualifierLobby, Optional[QualifierLobby]]:
+    """
+    Move a player into a qualifier lobby within <qual_lobbies>.
+    Return the new lobby and the lobby they were moved out of, if any.
+    """
     lobby = find_lobby(qual_lobbies, match_id)
 
     if not lobby:
@@ -234,6 +296,18 @@ def schedule_qual(worksheet: Worksheet,
     # and then put them in the new lobby
     lobby.players.append(player)
 
+    return lobby, old_lobby
+
+
+def schedule_qual(worksheet: Worksheet,
+                  qual_lobbies: list[QualifierLobby],
+                  match_id: str,
+                  player: Player,
+                  slots_start: str,
+                  slots_end: str) -> QualifierLobby:
+    """Schedule a player into a qualifier lobby."""
+    lobby, old_lobby = move_to_qual(qual_lobbies, match_id, player)
+
     # update sheet (old lobby)
     if old_lobby:
         worksheet.update(
@@ -253,19 +327,166 @@ def schedule_qual(worksheet: Worksheet,
     return lobby
 
 
+def get_availability_from_csv() \
+        -> dict[str, list[tuple[datetime, datetime]]]:
+    """
+    Return the time windows (in UTC) that each team can play
+    their qualifier lobby in, keyed by team name.
+
+    Each row of the CSV file is one window; a team may have several.
+    """
+    windows = pd.read_csv('availability.csv', dtype=str)
+
+    res: dict[str, list[tuple[datetime, datetime]]] = {}
+    for _, row in windows.iterrows():
+        start = datetime.strptime(row['Start'], '%Y-%m-%d %H:%M')
+        end = datetime.strptime(row['End'], '%Y-%m-%d %H:%M')
+        res.setdefault(row['Team Name'], []).append((
+            start.replace(tzinfo=timezone.utc),
+            end.replace(tzinfo=timezone.utc)
+        ))
+
+    return res
+
+
+def place_qual_players(
+        qual_lobbies: list[QualifierLobby],
+        players: list[Player],
+        availability: dict[str, list[tuple[datetime, datetime]]]
+) -> list[Player]:
+    """
+    Place every player in <players> into one of <qual_lobbies>
+    within their <availability>, keeping the lobbies evenly filled.
+
+    Players already in a lobby they're available for stay there unless
+    they're moved to make room, and players in any other lobby only leave
+    it for a new seat. Other players in the lobbies stay where they are.
+    Return the players that could not be placed.
+    """
+    placing = {p.team_name for p in players}
+
+    # the lobby indexes each player is available for
+    feasible: dict[str, list[int]] = {}
+    for player in players:
+        windows = availability.get(player.team_name, [])
+        feasible[player.team_name] = [
+            i for i, lob in enumerate(qual_lobbies)
+            if any(start <= lob.time <= end for start, end in windows)
+        ]
+
+    def find_seat(team_name: str) -> Optional[tuple[int, int]]:
+        """Return the (lobby index, slot) of <team_name>, if seated."""
+        for i, lob in enumerate(qual_lobbies):
+            for slot, p in enumerate(lob.players):
+                if p.team_name == team_name:
+                    return i, slot
+        return None
+
+    def has_room(i: int) -> bool:
+        return len(qual_lobbies[i]) < qual_lobbies[i].slot_count
+
+    def augment(player: Player) -> bool:
+        """
+        Make room for <player> by moving placed players along a chain
+        of lobbies that ends in a lobby with room.
+        """
+        # lobby index -> (previous lobby index, player moved out of it)
+        parent: dict[int, Optional[tuple[int, Player]]] = {}
+        queue = deque()
+        for i in feasible[player.team_name]:
+            parent[i] = None
+            queue.append(i)
+
+        while queue:
+            i = queue.popleft()
+            if has_room(i):
+                # walk the chain back, moving each player one lobby over
+                while parent[i] is not None:
+                    prev, moved = parent[i]
+                    qual_lobbies[prev].players.remove(moved)
+                    qual_lobbies[i].players.append(moved)
+                    i = prev
+                qual_lobbies[i].players.append(player)
+                return True
+
+            for moved in qual_lobbies[i].players:
+                if moved.team_name not in placing:
+                    continue
+                for j in feasible[moved.team_name]:
+                    if j not in parent:
+                        parent[j] = (i, moved)
+                        queue.append(j)
+
+        return False
+
+    # the most constrained players go first, into the emptiest lobby
+    unplaced: list[Player] = []
+    for player in sorted(players, key=lambda p: len(feasible[p.team_name])):
+        # moves made for earlier players may have seated this one already
+        seat = find_seat(player.team_name)
+        if seat is not None and seat[0] in feasible[player.team_name]:
+            continue
+        if seat is not None:
+            # give the seat up only while looking for a new one
+            old = qual_lobbies[seat[0]].players.pop(seat[1])
+
+        open_lobbies = [i for i in feasible[player.team_name] if has_room(i)]
+        if open_lobbies:
+            best = min(
+                open_lobbies,
+                key=lambda i: len(qual_lobbies[i]) / qual_lobbies[i].slot_count
+            )
+            qual_lobbies[best].players.append(player)
+        elif not augment(player):
+            if seat is not None:
+                qual_lobbies[seat[0]].players.insert(seat[1], old)
+            unplaced.append(player)
+
+    return unplaced
+
+
+def write_qual_lobbies(worksheet: Worksheet,
+                       qual_lobbies: list[QualifierLobby],
+                       slots_start: str,
+                       slots_end: str) -> None:
+    """Write the players of every lobby in a single batch update."""
+    worksheet.batch_update(
+        [
+            {
+                'range': f'{slots_start}{lob.sheet_row}:'
+                         f'{slots_end}{lob.sheet_row}',
+                'values': [
+                    [p.team_name for p in lob.players]
+                    + [''] * (lob.slot_count - len(lob))
+                ]
+            }
+            for lob in qual_lobbies
+        ],
+        raw=False
+    )
+
+
 def get_bracket_matches(worksheet: Worksheet,
                         match_range: str,
-                        col_idxs: dict[str, int]) -> list[BracketMatch]:
+                        projection: ColumnProjection) -> list[BracketMatch]:
     """
     Return a list of the bracket matches in <worksheet>.
     """
     cells = get_cells(
         worksheet=worksheet,
         range_=SheetRange(match_range),
-        col_idxs=col_idxs,
-        date_col=BSTAGE_DATE_SHEET_COL,
-        time_col=BSTAGE_TIME_SHEET_COL
+        projection=projection
     )
+    return parse_bracket_matches(cells, projection)
+
+
+def parse_bracket_matches(cells: list[list[Cell]],
+                          projection: ColumnProjection) -> list[BracketMatch]:
+    """
+    Return a list of the bracket matches in <cells>,
+    as fetched with <projection>.
+    """
+    col_idxs = projection.col_idxs
 
     return [
         BracketMatch(
@@ -283,6 +504,60 @@ def get_bracket_matches(worksheet: Worksheet,
     ]
 
 
+def get_tournament(spreadsheet: Spreadsheet,
+                   qual_worksheet: tuple[str, str],
+                   bracket_worksheets: dict[str, str]) \
+        -> tuple[list[QualifierLobby], dict[str, list[BracketMatch]]]:
+    """
+    Return the qualifier lobbies and the bracket matches of every stage
+    in <spreadsheet>, fetched together in a single request.
+
+    <qual_worksheet> is the (worksheet name, range) of the qualifiers and
+    <bracket_worksheets> maps each bracket stage's worksheet name to its
+    range. The bracket matches are keyed by worksheet name.
+    """
+    qual_projection = get_qual_projection()
+    match_projection = get_match_projection()
+
+    sources = [
+        (qual_worksheet[0], SheetRange(qual_worksheet[1]), qual_projection)
+    ]
+    sources += [
+        (name, SheetRange(range_), match_projection)
+        for name, range_ in bracket_worksheets.items()
+    ]
+    cells = get_cells_batch(spreadsheet, sources)
+
+    qual_lobbies = parse_qual_lobbies(cells[0], qual_projection)
+    matches = {
+        name: parse_bracket_matches(stage_cells, match_projection)
+        for name, stage_cells in zip(bracket_worksheets, cells[1:])
+    }
+    drop_duplicate_match_ids(matches)
+    return qual_lobbies, matches
+
+
+def drop_duplicate_match_ids(stages: dict[str, list[BracketMatch]]) -> None:
+    """
+    Remove every match of <stages> whose ID an earlier stage already used.
+    Reminders, the local schedule and the calendar feeds all key matches
+    by ID alone, so a reused ID would overwrite the other match.
+    """
+    seen = set()
+    for name, matches in stages.items():
+        kept = []
+        for match in matches:
+            if match.id and match.id in seen:
+                logger.warning(
+                    'Skipping match %s in %s, its ID is already used',
+                    match.id, name
+                )
+                continue
+            seen.add(match.id)
+            kept.append(match)
+        matches[:] = kept
+
+
 def validate_reschedule(matches: list[BracketMatch],
                         match_id: str,
                         player: Player) -> BracketMatch:
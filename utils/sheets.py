@@ -1,4 +1,6 @@
 import gspread
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+from gspread.spreadsheet import Spreadsheet
 from gspread.worksheet import Worksheet, Cell
 
 
@@ -20,6 +22,69 @@ class SheetRange:
         self.end_row = self.end_name[len(self.end_col):]
 
 
+class ColumnProjection:
+    """
+    The columns of a range that are actually needed, mapping each
+    column name to a column letter (e.g. 'B') or a span of adjacent
+    columns (e.g. 'E:L').
+
+    <col_idxs> maps each column name to the index where its data
+    can be found in a row of cells from get_cells(). A span also gets
+    a '<name>_end' entry for the index of its last column.
+    """
+    def __init__(self,
+                 columns: dict[str, str],
+                 unformatted: tuple[str, ...] = ('date', 'time')):
+        self.columns = columns
+        self.unformatted = unformatted
+
+        self.col_idxs: dict[str, int] = {}
+        i = 0
+        for name, (start, end) in self.spans().items():
+            self.col_idxs[name] = i
+            width = col_to_number(end) - col_to_number(start) + 1
+            if ':' in columns[name]:
+                self.col_idxs[f'{name}_end'] = i + width - 1
+            i += width
+
+    def ranges(self, range_: SheetRange) -> list[str]:
+        """Return the range of every column within the rows of <range_>."""
+        return [
+            f'{start}{range_.start_row}:{end}{range_.end_row}'
+            for start, end in self.spans().values()
+        ]
+
+    def spans(self) -> dict[str, tuple[str, str]]:
+        """Return the first and last column letter of every column."""
+        res: dict[str, tuple[str, str]] = {}
+        for name, cols in self.columns.items():
+            start, _, end = cols.partition(':')
+            res[name] = (start, end or start)
+        return res
+
+
+def col_to_number(col: str) -> int:
+    """Return the 1-based number of the column with letter(s) <col>."""
+    return a1_to_rowcol(f'{col}1')[1]
+
+
+def range_col(range_: str, offset: int) -> str:
+    """Return the letter(s) of the column <offset> columns into <range_>."""
+    number = col_to_number(SheetRange(range_).start_col) + offset
+    return rowcol_to_a1(1, number).rstrip('0123456789')
+
+
+def get_spreadsheet(spreadsheet_key: str) -> Spreadsheet:
+    """
+    Access the Google Sheets API and return the Spreadsheet
+    specified by <spreadsheet_key>.
+
+    The service account must have access to the spreadsheet.
+    """
+    sa = gspread.service_account(filename='service_account.json')
+    return sa.open_by_key(spreadsheet_key)
+
+
 def get_worksheet(spreadsheet_key: str, worksheet_name: str) -> Worksheet:
     """
     Access the Google Sheets API and return the Worksheet
@@ -27,46 +92,81 @@ def get_worksheet(spreadsheet_key: str, worksheet_name: str) -> Worksheet:
 
     The service account must have access to the spreadsheet.
     """
-    sa = gspread.service_account(filename='service_account.json')
-    sh = sa.open_by_key(spreadsheet_key)
-    return sh.worksheet(worksheet_name)
+    return get_spreadsheet(spreadsheet_key).worksheet(worksheet_name)
+
+
+def parse_cells(range_: SheetRange,
+                projection: ColumnProjection,
+                values: list[list[list]]) -> list[list[Cell]]:
+    """
+    Convert <values>, the fetched values of each range from
+    <projection>.ranges(<range_>), into rows of cells.
+    """
+    spans = projection.spans()
+    first_row = int(range_.start_row)
+    row_count = int(range_.end_row) - first_row + 1
+
+    # the API trims trailing empty rows and cells, so pad them back in
+    cells: list[list[Cell]] = [[] for _ in range(row_count)]
+    for (name, (start, end)), value_range in zip(spans.items(), values):
+        start_col = col_to_number(start)
+        width = col_to_number(end) - start_col + 1
+
+        for i in range(row_count):
+            row_values = value_range[i] if i < len(value_range) else []
+            for j in range(width):
+                value = row_values[j] if j < len(row_values) else ''
+                # only the unformatted values of dates and times are wanted
+                if name not in projection.unformatted:
+                    value = str(value)
+                cells[i].append(Cell(first_row + i, start_col + j, value))
+
+    return cells
 
 
 def get_cells(worksheet: Worksheet,
               range_: SheetRange,
-              col_idxs: dict[str, int],
-              date_col: str,
-              time_col: str) -> list[list[Cell]]:
-    """Get the cells specified by <range_> from <worksheet>."""
-    # get the cell objects because it includes empty cells
-    cells = worksheet.range(range_.full_range)
-
-    # convert <cells> into a 2D list by rows
-    rows: dict[int, list[Cell]] = {}
-    for cell in cells:
-        if cell.row not in rows:
-            rows[cell.row] = []
-        rows[cell.row].append(cell)
-
-    cells = list(rows.values())
-
-    # get the cell values because we want UNFORMATTED_VALUE
+              projection: ColumnProjection) -> list[list[Cell]]:
+    """
+    Get the cells of the columns in <projection> from the rows
+    specified by <range_> in <worksheet>.
+
+    Each projected column is fetched as its own narrow range
+    in a single batch request.
+    """
     values = worksheet.batch_get(
-        [
-            f'{date_col}{range_.start_row}:{date_col}{range_.end_row}',
-            f'{time_col}{range_.start_row}:{time_col}{range_.end_row}'
-        ],
+        projection.ranges(range_),
         value_render_option='UNFORMATTED_VALUE'
     )
+    return parse_cells(range_, projection, values)
 
-    # update the cell objects with the unformatted values
-    date_values = values[0]
-    time_values = values[1]
-    for i, (date, time) in enumerate(zip(date_values, time_values)):
-        # i = the current row
-        # we need to reference the 0th index because <date> and <time>
-        # are lists of size 1
-        cells[i][col_idxs['date']].value = date[0]
-        cells[i][col_idxs['time']].value = time[0]
 
-    return cells
+def get_cells_batch(
+        spreadsheet: Spreadsheet,
+        sources: list[tuple[str, SheetRange, ColumnProjection]]
+) -> list[list[list[Cell]]]:
+    """
+    Same as get_cells(), but for several (worksheet name, range,
+    projection) <sources> across <spreadsheet> in a single request.
+
+    Return the rows of cells of each source in the same order.
+    """
+    ranges: list[str] = []
+    for worksheet_name, range_, projection in sources:
+        sheet = worksheet_name.replace("'", "''")
+        ranges += [f"'{sheet}'!{r}" for r in projection.ranges(range_)]
+
+    response = spreadsheet.values_batch_get(
+        ranges,
+        params={'valueRenderOption': 'UNFORMATTED_VALUE'}
+    )
+    value_ranges = [vr.get('values', []) for vr in response['valueRanges']]
+
+    res: list[list[list[Cell]]] = []
+    i = 0
+    for _, range_, projection in sources:
+        count = len(projection.columns)
+        res.append(parse_cells(range_, projection, value_ranges[i:i + count]))
+        i += count
+
+    return res
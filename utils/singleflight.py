@@ -0,0 +1,64 @@
+import copy
+import threading
+from typing import Callable, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    """A call in flight, waited on by the callers that joined it."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into a single call.
+
+    A caller arriving while a call for its key is in flight waits for that
+    call instead of making its own. Every caller gets its own deep copy of
+    the result, so callers can modify what they get back.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Return a copy of the result of <fn>, calling it only if no call
+        for <key> is already in flight.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    # forget() may have replaced it already
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Stop new callers from joining the call in flight for <key>.
+        Call this after writing, since a read that started before the
+        write may not see it.
+        """
+        with self._lock:
+            self._calls.pop(key, None)
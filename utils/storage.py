@@ -0,0 +1,529 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
+from utils.models import Player, QualifierLobby, BracketMatch
+from utils.sheets import (
+    get_spreadsheet,
+    get_worksheet,
+    Spreadsheet,
+    Worksheet
+)
+from utils.singleflight import SingleFlight
+from utils.scheduler import (
+    get_qual_projection,
+    get_match_projection,
+    get_qual_lobbies,
+    get_bracket_matches,
+    get_tournament,
+    drop_duplicate_match_ids,
+    get_player_from_csv,
+    get_referee_from_csv,
+    schedule_qual,
+    move_to_qual,
+    write_qual_lobbies,
+    reschedule_match
+)
+import config
+from config import (
+    SPREADSHEET_KEY,
+    QUAL_WORKSHEET_NAME,
+    QUAL_RANGE,
+    QUAL_SLOTS_COL_START,
+    QUAL_SLOTS_COL_END,
+    BSTAGE_WORKSHEET_NAME,
+    BSTAGE_RANGE,
+    BSTAGE_DATE_SHEET_COL,
+    BSTAGE_TIME_SHEET_COL
+)
+
+# optional, see the README. without them only the current stage
+# is read and everything is kept in the spreadsheet
+BSTAGE_WORKSHEETS = getattr(config, 'BSTAGE_WORKSHEETS', None)
+STORAGE_BACKEND = getattr(config, 'STORAGE_BACKEND', 'sheets')
+
+# how long the cogs warming at the same time share a tournament snapshot
+SNAPSHOT_MAX_AGE = 60
+# how long the cogs wait to warm again after the tournament couldn't be read
+WARM_RETRY_SECONDS = 60
+# how often the cogs mirroring the tournament re-read it once warm,
+# to pick up changes made directly on the spreadsheet
+REFRESH_SECONDS = 300
+
+
+class StorageBackend(ABC):
+    """Where the qualifier lobbies and bracket matches are kept."""
+
+    def __init__(self):
+        # (when it was started, the read) of the shared tournament snapshot
+        self._snapshot: Optional[tuple[float, asyncio.Future]] = None
+        # qualifier lobbies are read concurrently but written one at a time.
+        # the version is bumped by every write, so a command can tell
+        # whether the lobbies it read beforehand are still current.
+        # they live here rather than in a cog so they survive its reload
+        self.qual_lock = asyncio.Lock()
+        self.qual_version = 0
+
+    @abstractmethod
+    def get_qual_lobbies(self) -> list[QualifierLobby]:
+        """Return the qualifier lobbies."""
+
+    @abstractmethod
+    def get_bracket_matches(self) -> list[BracketMatch]:
+        """Return the bracket matches of the current stage."""
+
+    @abstractmethod
+    def get_tournament(self) \
+            -> tuple[list[QualifierLobby], dict[str, list[BracketMatch]]]:
+        """
+        Return the qualifier lobbies and the bracket matches of every stage
+        in BSTAGE_WORKSHEETS, keyed by worksheet name.
+        """
+
+    async def load_tournament(self) \
+            -> tuple[list[QualifierLobby], dict[str, list[BracketMatch]]]:
+        """
+        Return get_tournament(), read in a worker thread. Callers share
+        one read until something is written or it is SNAPSHOT_MAX_AGE
+        seconds old, so don't modify what it returns.
+        """
+        if (self._snapshot is None
+                or time.monotonic() - self._snapshot[0] > SNAPSHOT_MAX_AGE):
+            self._snapshot = (
+                time.monotonic(),
+                asyncio.ensure_future(asyncio.to_thread(self.get_tournament))
+            )
+        snapshot = self._snapshot
+
+        try:
+            # a cancelled caller shouldn't cancel the read for the others
+            return await asyncio.shield(snapshot[1])
+        except Exception:
+            if self._snapshot is snapshot:
+                self._snapshot = None
+            raise
+
+    def forget_snapshot(self) -> None:
+        """Make the next load_tournament() read the tournament again."""
+        self._snapshot = None
+
+    def reload_config(self) -> None:
+        """
+        Start using the values of a reloaded config.py. The backend is
+        kept rather than replaced, so commands already running keep
+        sharing its qualifier lock with the new ones.
+        """
+        self.forget_snapshot()
+
+    def prepare(self) -> None:
+        """
+        Get the backend ready before the cogs use it. This may read the
+        spreadsheet, so it's called once at startup in a worker thread.
+        """
+
+    @abstractmethod
+    def schedule_qual(self,
+                      qual_lobbies: list[QualifierLobby],
+                      match_id: str,
+                      player: Player) -> QualifierLobby:
+        """Schedule <player> into the qualifier lobby with <match_id>."""
+
+    @abstractmethod
+    def write_qual_lobbies(self, qual_lobbies: list[QualifierLobby]) -> None:
+        """Save the players of every lobby in <qual_lobbies>."""
+
+    @abstractmethod
+    def reschedule_match(self,
+                         match: BracketMatch,
+                         new_time: datetime) -> BracketMatch:
+        """Reschedule <match> to <new_time>."""
+
+
+class SheetsBackend(StorageBackend):
+    """
+    Keep everything in the Google Sheets spreadsheet.
+
+    Concurrent reads of the same range share one API call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # the spreadsheet and worksheets are only opened once
+        self._spreadsheet: Optional[Spreadsheet] = None
+        self._worksheets: dict[str, Worksheet] = {}
+        self._reads = SingleFlight()
+
+    @property
+    def qual_key(self) -> tuple[str, str]:
+        return QUAL_WORKSHEET_NAME, QUAL_RANGE
+
+    @property
+    def bstage_key(self) -> tuple[str, str]:
+        return BSTAGE_WORKSHEET_NAME, BSTAGE_RANGE
+
+    def reload_config(self) -> None:
+        super().reload_config()
+        # the spreadsheet key may have changed
+        self._spreadsheet = None
+        self._worksheets.clear()
+
+    def spreadsheet(self) -> Spreadsheet:
+        if self._spreadsheet is None:
+            self._spreadsheet = get_spreadsheet(SPREADSHEET_KEY)
+        return self._spreadsheet
+
+    def worksheet(self, name: str) -> Worksheet:
+        if name not in self._worksheets:
+            self._worksheets[name] = get_worksheet(
+                spreadsheet_key=SPREADSHEET_KEY,
+                worksheet_name=name
+            )
+        return self._worksheets[name]
+
+    def forget_reads(self, key: tuple[str, str]) -> None:
+        """Make the next read of the (worksheet, range) <key> start afresh."""
+        self._reads.forget(key)
+
+    def get_qual_lobbies(self) -> list[QualifierLobby]:
+        return self._reads.do(
+            self.qual_key,
+            lambda: get_qual_lobbies(
+                worksheet=self.worksheet(QUAL_WORKSHEET_NAME),
+                qual_range=QUAL_RANGE,
+                projection=get_qual_projection()
+            )
+        )
+
+    def get_bracket_matches(self) -> list[BracketMatch]:
+        return self._reads.do(
+            self.bstage_key,
+            lambda: get_bracket_matches(
+                worksheet=self.worksheet(BSTAGE_WORKSHEET_NAME),
+                match_range=BSTAGE_RANGE,
+                projection=get_match_projection()
+            )
+        )
+
+    def get_tournament(self) \
+            -> tuple[list[QualifierLobby], dict[str, list[BracketMatch]]]:
+        return get_tournament(
+            spreadsheet=self.spreadsheet(),
+            qual_worksheet=(QUAL_WORKSHEET_NAME, QUAL_RANGE),
+            bracket_worksheets=(
+                BSTAGE_WORKSHEETS or {BSTAGE_WORKSHEET_NAME: BSTAGE_RANGE}
+            )
+        )
+
+    def schedule_qual(self,
+                      qual_lobbies: list[QualifierLobby],
+                      match_id: str,
+                      player: Player) -> QualifierLobby:
+        try:
+            return schedule_qual(
+                worksheet=self.worksheet(QUAL_WORKSHEET_NAME),
+                qual_lobbies=qual_lobbies,
+                match_id=match_id,
+                player=player,
+                slots_start=QUAL_SLOTS_COL_START,
+                slots_end=QUAL_SLOTS_COL_END
+            )
+        finally:
+            self.forget_reads(self.qual_key)
+            self.forget_snapshot()
+
+    def write_qual_lobbies(self, qual_lobbies: list[QualifierLobby]) -> None:
+        try:
+            write_qual_lobbies(
+                worksheet=self.worksheet(QUAL_WORKSHEET_NAME),
+                qual_lobbies=qual_lobbies,
+                slots_start=QUAL_SLOTS_COL_START,
+                slots_end=QUAL_SLOTS_COL_END
+            )
+        finally:
+            self.forget_reads(self.qual_key)
+            self.forget_snapshot()
+
+    def reschedule_match(self,
+                         match: BracketMatch,
+                         new_time: datetime) -> BracketMatch:
+        try:
+            return reschedule_match(
+                worksheet=self.worksheet(BSTAGE_WORKSHEET_NAME),
+                match=match,
+                new_time=new_time,
+                date_col=BSTAGE_DATE_SHEET_COL,
+                time_col=BSTAGE_TIME_SHEET_COL
+            )
+        finally:
+            self.forget_reads(self.bstage_key)
+            self.forget_snapshot()
+
+
+class LocalBackend(StorageBackend):
+    """
+    Keep everything in a local SQLite database and periodically export
+    the changed rows to the spreadsheet with export().
+
+    The database is seeded from <sheets> by prepare() while it is empty.
+    Its methods may be called from worker threads.
+    """
+    def __init__(self, path: str, sheets: SheetsBackend):
+        super().__init__()
+        self.sheets = sheets
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # one thread at a time, so transactions don't interleave
+        self._lock = threading.Lock()
+        self.conn.executescript(
+            '''
+            CREATE TABLE IF NOT EXISTS qual_lobbies (
+                id TEXT PRIMARY KEY,
+                time REAL NOT NULL,
+                players TEXT NOT NULL,
+                slot_count INTEGER NOT NULL,
+                ref_osu TEXT,
+                sheet_row INTEGER NOT NULL,
+                dirty INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS matches (
+                id TEXT PRIMARY KEY,
+                time REAL NOT NULL,
+                p1_team TEXT,
+                p2_team TEXT,
+                ref_osu TEXT,
+                sheet_row INTEGER NOT NULL,
+                dirty INTEGER NOT NULL DEFAULT 0
+            );
+            '''
+        )
+
+    def prepare(self) -> None:
+        with self._lock:
+            empty = self.conn.execute(
+                'SELECT NOT EXISTS (SELECT 1 FROM qual_lobbies) '
+                'AND NOT EXISTS (SELECT 1 FROM matches)'
+            ).fetchone()[0]
+        if empty:
+            self.import_from_sheets()
+
+    def reload_config(self) -> None:
+        super().reload_config()
+        self.sheets.reload_config()
+
+    def import_from_sheets(self) -> None:
+        """
+        Replace the rows that have no unexported changes
+        with the current contents of the spreadsheet.
+        """
+        qual_lobbies = self.sheets.get_qual_lobbies()
+        matches = self.sheets.get_bracket_matches()
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO qual_lobbies VALUES (?, ?, ?, ?, ?, ?, 0) '
+                'ON CONFLICT (id) DO UPDATE SET '
+                'time = excluded.time, players = excluded.players, '
+                'slot_count = excluded.slot_count, '
+                'ref_osu = excluded.ref_osu, sheet_row = excluded.sheet_row '
+                'WHERE NOT dirty',
+                [_lobby_to_row(lob) for lob in qual_lobbies if lob.id]
+            )
+            self.conn.executemany(
+                'INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, 0) '
+                'ON CONFLICT (id) DO UPDATE SET '
+                'time = excluded.time, p1_team = excluded.p1_team, '
+                'p2_team = excluded.p2_team, ref_osu = excluded.ref_osu, '
+                'sheet_row = excluded.sheet_row '
+                'WHERE NOT dirty',
+                [_match_to_row(match) for match in matches if match.id]
+            )
+        self.forget_snapshot()
+
+    def get_qual_lobbies(self) -> list[QualifierLobby]:
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT id, time, players, slot_count, ref_osu, sheet_row '
+                'FROM qual_lobbies ORDER BY sheet_row'
+            ).fetchall()
+        return [
+            QualifierLobby(
+                id=id_,
+                time=datetime.fromtimestamp(time, timezone.utc),
+                players=[
+                    p for p in map(_player, json.loads(players))
+                    if p is not None
+                ],
+                slot_count=slot_count,
+                referee=get_referee_from_csv(osu_name=ref_osu or ''),
+                sheet_row=sheet_row
+            )
+            for id_, time, players, slot_count, ref_osu, sheet_row in rows
+        ]
+
+    def get_bracket_matches(self) -> list[BracketMatch]:
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT id, time, p1_team, p2_team, ref_osu, sheet_row '
+                'FROM matches ORDER BY sheet_row'
+            ).fetchall()
+        return [
+            BracketMatch(
+                id=id_,
+                time=datetime.fromtimestamp(time, timezone.utc),
+                player1=_player(p1_team),
+                player2=_player(p2_team),
+                referee=get_referee_from_csv(osu_name=ref_osu or ''),
+                sheet_row=sheet_row
+            )
+            for id_, time, p1_team, p2_team, ref_osu, sheet_row in rows
+        ]
+
+    def get_tournament(self) \
+            -> tuple[list[QualifierLobby], dict[str, list[BracketMatch]]]:
+        # the other stages are only kept in the spreadsheet,
+        # but the local rows are newer than the sheet's
+        _, stages = self.sheets.get_tournament()
+        stages[BSTAGE_WORKSHEET_NAME] = self.get_bracket_matches()
+        drop_duplicate_match_ids(stages)
+        return self.get_qual_lobbies(), stages
+
+    def schedule_qual(self,
+                      qual_lobbies: list[QualifierLobby],
+                      match_id: str,
+                      player: Player) -> QualifierLobby:
+        lobby, old_lobby = move_to_qual(qual_lobbies, match_id, player)
+        self.write_qual_lobbies([lob for lob in (lobby, old_lobby) if lob])
+        return lobby
+
+    def write_qual_lobbies(self, qual_lobbies: list[QualifierLobby]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'UPDATE qual_lobbies SET players = ?, dirty = 1 WHERE id = ?',
+                [
+                    (json.dumps([p.team_name for p in lob.players]), lob.id)
+                    for lob in qual_lobbies
+                ]
+            )
+        self.forget_snapshot()
+
+    def reschedule_match(self,
+                         match: BracketMatch,
+                         new_time: datetime) -> BracketMatch:
+        with self._lock, self.conn:
+            self.conn.execute(
+                'UPDATE matches SET time = ?, dirty = 1 WHERE id = ?',
+                (new_time.timestamp(), match.id)
+            )
+        self.forget_snapshot()
+        return match
+
+    def export(self) -> int:
+        """
+        Write every row changed since the last export to the spreadsheet,
+        one batch update per worksheet. Return the number of rows written.
+        """
+        qual_lobbies = [
+            lob for lob in self.get_qual_lobbies()
+            if lob.id in self._dirty_ids('qual_lobbies')
+        ]
+        if qual_lobbies:
+            self.sheets.write_qual_lobbies(qual_lobbies)
+
+        matches = [
+            match for match in self.get_bracket_matches()
+            if match.id in self._dirty_ids('matches')
+        ]
+        if matches:
+            self.sheets.worksheet(BSTAGE_WORKSHEET_NAME).batch_update(
+                [
+                    {
+                        'range': f'{col}{match.sheet_row}',
+                        'values': [[match.time.strftime(fmt)]]
+                    }
+                    for match in matches
+                    for col, fmt in (
+                        (BSTAGE_DATE_SHEET_COL, '%a %b %d'),
+                        (BSTAGE_TIME_SHEET_COL, '%H:%M')
+                    )
+                ],
+                raw=False
+            )
+            self.sheets.forget_reads(self.sheets.bstage_key)
+
+        # only clear what was exported, in case a row changed meanwhile
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'UPDATE qual_lobbies SET dirty = 0 WHERE id = ? AND '
+                'players = ?',
+                [
+                    (lob.id, json.dumps([p.team_name for p in lob.players]))
+                    for lob in qual_lobbies
+                ]
+            )
+            self.conn.executemany(
+                'UPDATE matches SET dirty = 0 WHERE id = ? AND time = ?',
+                [(match.id, match.time.timestamp()) for match in matches]
+            )
+
+        return len(qual_lobbies) + len(matches)
+
+    def _dirty_ids(self, table: str) -> set[str]:
+        with self._lock:
+            return {
+                id_ for id_, in
+                self.conn.execute(f'SELECT id FROM {table} WHERE dirty')
+            }
+
+
+def _player(team_name: Optional[str]) -> Optional[Player]:
+    if team_name is None:
+        return
+    return get_player_from_csv(team_name=team_name)
+
+
+def _lobby_to_row(lobby: QualifierLobby) -> tuple:
+    return (
+        lobby.id,
+        lobby.time.timestamp(),
+        json.dumps([p.team_name for p in lobby.players]),
+        lobby.slot_count,
+        lobby.referee.osu_name if lobby.referee else None,
+        lobby.sheet_row
+    )
+
+
+def _match_to_row(match: BracketMatch) -> tuple:
+    return (
+        match.id,
+        match.time.timestamp(),
+        match.player1.team_name if match.player1 else None,
+        match.player2.team_name if match.player2 else None,
+        match.referee.osu_name if match.referee else None,
+        match.sheet_row
+    )
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    Return the storage backend chosen by STORAGE_BACKEND in the config,
+    either 'sheets' or 'local'.
+    """
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == 'local':
+            _storage = LocalBackend('tournament.db', SheetsBackend())
+        else:
+            _storage = SheetsBackend()
+    return _storage
+
+
+def reload_storage_config() -> None:
+    """Make the storage backend, if there is one yet, use the new config."""
+    if _storage is not None:
+        _storage.reload_config()